@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Concurrency autotuning."""
+
+from typing import Dict, Any, List, Optional, Tuple
+
+from src.logging import logger
+from src.metrics import metrics
+
+# Relative change in throughput that is treated as noise
+TOLERANCE = 0.1
+
+# Fraction of the memory ceiling above which batches are not grown
+HEADROOM = 0.8
+
+# Factor by which the batch size is grown or shrunk in one step
+BATCH_SIZE_STEP = 1.5
+
+
+class Autotuner:
+    """Hill-climbing tuner of the parse worker count and batch size.
+
+    After every batch the throughput in files per second is compared with
+    the best known setting. A step that made it slower is undone and that
+    knob's direction reversed; a step that made no difference moves on to
+    the other knob. Whenever memory use exceeds the ceiling the batch size
+    is halved first, and it is never grown close to the ceiling.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        batch_size: int,
+        memory_ceiling: int,
+        max_workers: int,
+        min_batch_size: int = 10,
+        max_batch_size: int = 1000,
+    ):
+        self.memory_ceiling = memory_ceiling
+        self.bounds: Dict[str, Tuple[int, int]] = {
+            "workers": (1, max(1, max_workers)),
+            "batch_size": (min_batch_size, max(min_batch_size, max_batch_size)),
+        }
+        self.settings: Dict[str, int] = {
+            "workers": self._clamp("workers", workers),
+            "batch_size": self._clamp("batch_size", batch_size),
+        }
+        self.decisions: List[Dict[str, Any]] = []
+        self._directions = {"workers": 1, "batch_size": 1}
+        self._knob = "batch_size"
+        self._previous: Optional[int] = None
+        self._throughput: Optional[float] = None
+
+    @property
+    def workers(self) -> int:
+        return self.settings["workers"]
+
+    @property
+    def batch_size(self) -> int:
+        return self.settings["batch_size"]
+
+    def _clamp(self, knob: str, value: int) -> int:
+        low, high = self.bounds[knob]
+        return min(high, max(low, value))
+
+    def _other(self, knob: str) -> str:
+        return "workers" if knob == "batch_size" else "batch_size"
+
+    def _set(self, knob: str, value: int, reason: str, **extra: float) -> None:
+        value = self._clamp(knob, value)
+        if value == self.settings[knob]:
+            return
+        decision = {
+            "knob": knob,
+            "from": self.settings[knob],
+            "to": value,
+            "reason": reason,
+            **extra,
+        }
+        self.settings[knob] = value
+        self.decisions.append(decision)
+        metrics.set(f"autotune_{knob}", value)
+        logger.info("Autotune decision", extra=decision)
+
+    def _step(self, knob: str) -> int:
+        value = self.settings[knob]
+        if knob == "workers":
+            return value + self._directions[knob]
+        if self._directions[knob] > 0:
+            return round(value * BATCH_SIZE_STEP)
+        return round(value / BATCH_SIZE_STEP)
+
+    def observe(self, files: int, seconds: float, memory: int) -> None:
+        """Record the outcome of a batch and choose the settings of the next.
+
+        Args:
+            files: Number of files in the batch
+            seconds: Wall time of the batch
+            memory: Memory in use after the batch in bytes
+
+        Returns:
+            None
+        """
+        throughput = files / seconds if seconds > 0 else 0.0
+        extra = {"files-per-second": round(throughput, 2), "memory": memory}
+        if memory > self.memory_ceiling:
+            # Measurements at the old setting no longer apply
+            self._set("batch_size", self.batch_size // 2, "memory", **extra)
+            self._directions["batch_size"] = -1
+            self._previous, self._throughput = None, None
+            return
+
+        if self._throughput is None or self._previous is None:
+            self._throughput = throughput
+        elif throughput < self._throughput * (1 - TOLERANCE):
+            # The last step made it slower, so undo it and try the other way later
+            self._set(self._knob, self._previous, "slower", **extra)
+            self._directions[self._knob] *= -1
+            self._knob = self._other(self._knob)
+        elif throughput > self._throughput * (1 + TOLERANCE):
+            # Keep stepping the same knob in the same direction
+            self._throughput = throughput
+        else:
+            self._throughput = max(self._throughput, throughput)
+            self._knob = self._other(self._knob)
+
+        # Take the next step, skipping a knob that cannot move
+        for _ in range(2):
+            knob = self._knob
+            if (
+                knob == "batch_size"
+                and self._directions[knob] > 0
+                and memory > self.memory_ceiling * HEADROOM
+            ):
+                self._directions[knob] = -1
+            value = self._clamp(knob, self._step(knob))
+            if value != self.settings[knob]:
+                self._previous = self.settings[knob]
+                self._set(knob, value, "explore", **extra)
+                return
+            self._directions[knob] *= -1
+            self._knob = self._other(knob)
+        self._previous = None
@@ -4,10 +4,12 @@
 
 from pathlib import Path
 from typing import List
-from multiprocessing import cpu_count
 
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from src.resources import effective_cpu_count
+
 TOPICS = [
     "agriculture",
     "economy",
@@ -30,13 +32,68 @@ class Config(BaseSettings):
 
     model_config = SettingsConfigDict(cli_parse_args=True)
 
+    autotune: bool = Field(
+        default=False,
+        description="Tune the parse thread count and batch size while processing. "
+        "The embedding workers (--embed_workers) are not tuned.",
+    )
+    autotune_max_batch_size: int = 1000
+    autotune_max_workers: int = Field(
+        default=0,
+        description="Most parse threads the autotuner tries, defaults to twice the "
+        "effective CPU count because parse threads also wait on file reads",
+    )
+    autotune_min_batch_size: int = 10
     batch_size: int = 100
+    bench_docs: int = 200
+    bench_ef_construction: List[int] = [100, 200]
+    bench_ef_search: List[int] = [10, 50, 100]
+    bench_k: int = 10
+    bench_m: List[int] = [16, 32]
+    bench_queries: int = 200
+    bench_repeat: int = 3
+    bench_sections: int = 5
+    bench_spaces: List[str] = ["l2"]
+    bench_threshold: float = 0.25
+    bench_update: bool = False
+    bill_id: str = ""
+    classify_epochs: int = 20
+    cluster_epochs: int = 3
+    cluster_method: str = "kmeans"
+    compact: bool = False
     data_dir: Path = Path("data")
     db_dir: Path = Path("embeddings")
     dedupe: bool = True
+    embed_threads: int = 1
+    embed_workers: int = effective_cpu_count()
+    hnsw_construction_ef: int = 100
+    hnsw_m: int = 16
+    hnsw_search_ef: int = 100
+    hnsw_space: str = "l2"
     limit: int = 10000
-    max_workers: int = cpu_count()
+    max_workers: int = effective_cpu_count()
+    memory_fraction: float = 0.8
+    memory_limit: int = 0
+    metrics_format: str = "json"
+    metrics_interval: float = 30.0
+    min_cluster_size: int = 25
+    n_clusters: int = 50
+    num_shards: int = 8
     out_dir: Path = Path("out")
+    page_size: int = 1000
     prefix: str = "BILLS-"
+    profile: bool = False
     query: str = "Judiciary"
+    rebuild: bool = False
+    search_mode: str = "vector"
+    seed: int = 0
+    shard_by: str = ""
+    shard_workers: int = 4
+    shards: List[str] = []
+    show_text: bool = False
+    similar_k: int = 10
+    snapshot_dir: Path = Path("snapshot")
+    token_budget: int = 8192
     topics: List[str] = TOPICS
+    write_batch_size: int = 1000
+    write_interval: float = 10.0
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Document store utilities."""
+
+import hashlib
+import sqlite3
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+
+class DocumentStore:
+    """Compressed, content-addressed store of document text.
+
+    Each text is stored once, zlib-compressed, under the SHA-256 hash of its
+    content, so identical texts share a single row.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._init_db()
+
+    def _init_db(self) -> None:
+        """Initialize the database."""
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    hash TEXT PRIMARY KEY,
+                    body BLOB
+                )
+            """
+            )
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        """Return the content address of a text."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    # noinspection SqlResolve
+    def put_many(self, texts: List[str]) -> List[str]:
+        """Store texts that are not already stored.
+
+        Args:
+            texts: Texts to store
+
+        Returns:
+            The content hash of each text
+        """
+        hashes = [self.content_hash(text) for text in texts]
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO documents (hash, body) VALUES (?, ?)",
+                [
+                    (digest, zlib.compress(text.encode("utf-8")))
+                    for digest, text in zip(hashes, texts)
+                ],
+            )
+        return hashes
+
+    # noinspection SqlResolve
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, str]:
+        """Fetch texts by content hash.
+
+        Args:
+            hashes: Content hashes to fetch
+
+        Returns:
+            A mapping of hash to text for the hashes that are stored
+        """
+        hashes = list(set(hashes))
+        result: Dict[str, str] = {}
+        with sqlite3.connect(self.path) as conn:
+            # Stay well below SQLite's limit on the number of query parameters
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                # Only "?" placeholders are formatted in; the hashes are bound
+                query = f"SELECT hash, body FROM documents WHERE hash IN ({placeholders})"  # nosec B608
+                cursor = conn.execute(query, chunk)
+                for digest, body in cursor:
+                    result[digest] = zlib.decompress(body).decode("utf-8")
+        return result
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Embedding utilities."""
+
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from functools import cached_property
+from multiprocessing import get_context, shared_memory
+from multiprocessing.sharedctypes import Synchronized
+from typing import TYPE_CHECKING, Callable, List, Optional, Protocol, Tuple, Union
+
+import numpy as np
+from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+
+from src.logging import logger
+from src.metrics import metrics
+
+if TYPE_CHECKING:
+    from onnxruntime import InferenceSession
+    from tokenizers import Tokenizer
+
+EMBEDDING_DIM = 384
+MAX_SEQ_LENGTH = 256
+
+# Encoder owned by the current worker process
+_encoder: Optional[Union["Encoder", "HashingEncoder"]] = None
+
+
+@dataclass
+class EmbeddingStats:
+    """Counters describing the work done by the encoder."""
+
+    documents: int = 0
+    batches: int = 0
+    tokens: int = 0
+    padded_tokens: int = 0
+    seconds: float = 0.0
+
+    def add(self, other: "EmbeddingStats") -> None:
+        """Accumulate the counts of another stats object, excluding time."""
+        self.documents += other.documents
+        self.batches += other.batches
+        self.tokens += other.tokens
+        self.padded_tokens += other.padded_tokens
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.documents / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def padding_waste(self) -> float:
+        """Fraction of the encoded tokens that were padding."""
+        if not self.padded_tokens:
+            return 0.0
+        return 1 - self.tokens / self.padded_tokens
+
+
+class Embedder(Protocol):
+    """Interface of the embedders used for ingest, such as `EmbeddingPool`."""
+
+    stats: EmbeddingStats
+
+    def embed(self, documents: List[str]) -> np.ndarray: ...
+
+    def close(self) -> None: ...
+
+
+def plan_batches(lengths: List[int], token_budget: int) -> List[List[int]]:
+    """Group inputs of similar token length into batches capped by total tokens.
+
+    Each batch is padded to its longest input, so the budget is applied to the
+    padded size: `len(batch) * max(lengths in batch) <= token_budget`. A single
+    input longer than the budget still gets a batch of its own.
+
+    Args:
+        lengths: Token length of each input
+        token_budget: Maximum number of padded tokens in a batch
+
+    Returns:
+        A list of batches, each a list of indices into `lengths`
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    for idx in order:
+        # Inputs are visited in ascending length, so idx is the longest so far
+        if batch and max(lengths[idx], 1) * (len(batch) + 1) > token_budget:
+            batches.append(batch)
+            batch = []
+        batch.append(idx)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class Encoder(ONNXMiniLM_L6_V2):
+    """ONNX all-MiniLM-L6-v2 encoder with a pinned inference thread count.
+
+    This is the same model Chroma uses as its default embedding function, so
+    vectors computed here are compatible with `query_texts` searches.
+    """
+
+    def __init__(self, num_threads: int = 1, token_budget: int = 8192):
+        super().__init__()
+        self.num_threads = num_threads
+        self.token_budget = token_budget
+
+    @cached_property
+    def tokenizer(self) -> "Tokenizer":
+        tokenizer = self.Tokenizer.from_file(
+            os.path.join(
+                self.DOWNLOAD_PATH, self.EXTRACTED_FOLDER_NAME, "tokenizer.json"
+            )
+        )
+        # Padding is applied per batch in `encode`, not to a fixed length
+        tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        tokenizer.no_padding()
+        return tokenizer
+
+    @cached_property
+    def model(self) -> "InferenceSession":
+        so = self.ort.SessionOptions()
+        so.log_severity_level = 3
+        so.intra_op_num_threads = self.num_threads
+        so.inter_op_num_threads = 1
+        return self.ort.InferenceSession(
+            os.path.join(self.DOWNLOAD_PATH, self.EXTRACTED_FOLDER_NAME, "model.onnx"),
+            providers=self.ort.get_available_providers(),
+            sess_options=so,
+        )
+
+    def _run(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """Run the model on a padded batch and mean-pool the token states."""
+        model_output = self.model.run(
+            None,
+            {
+                "input_ids": input_ids,
+                "attention_mask": attention_mask,
+                "token_type_ids": np.zeros_like(input_ids),
+            },
+        )
+        last_hidden_state = model_output[0]
+        mask = np.expand_dims(attention_mask, -1).astype(last_hidden_state.dtype)
+        embeddings = np.sum(last_hidden_state * mask, 1) / np.clip(
+            mask.sum(1), a_min=1e-9, a_max=None
+        )
+        return self._normalize(embeddings).astype(np.float32)
+
+    def encode(self, documents: List[str]) -> Tuple[np.ndarray, EmbeddingStats]:
+        """Embed documents in token-budgeted batches.
+
+        Documents are tokenized once, grouped by token length with
+        `plan_batches` and each batch is padded only to its longest document.
+        The output rows are in the input order.
+
+        Args:
+            documents: List of documents to embed
+
+        Returns:
+            A (n, 384) float32 array of normalized embeddings and the encoder stats
+        """
+        self._download_model_if_not_exists()
+        encoded = self.tokenizer.encode_batch(documents)
+        lengths = [len(e.ids) for e in encoded]
+        out = np.empty((len(documents), EMBEDDING_DIM), dtype=np.float32)
+        stats = EmbeddingStats(documents=len(documents))
+        for batch in plan_batches(lengths, self.token_budget):
+            longest = max(lengths[idx] for idx in batch)
+            input_ids = np.zeros((len(batch), longest), dtype=np.int64)
+            attention_mask = np.zeros((len(batch), longest), dtype=np.int64)
+            for row, idx in enumerate(batch):
+                input_ids[row, : lengths[idx]] = encoded[idx].ids
+                attention_mask[row, : lengths[idx]] = 1
+            out[batch] = self._run(input_ids, attention_mask)
+            stats.batches += 1
+            stats.tokens += int(attention_mask.sum())
+            stats.padded_tokens += input_ids.size
+        return out, stats
+
+
+class HashingEncoder:
+    """Deterministic stand-in for `Encoder` that needs no model.
+
+    Vectors are seeded from a hash of the text, so the embedding pool and
+    everything downstream of it can run without downloading the model.
+    """
+
+    def __init__(self, num_threads: int = 1, token_budget: int = 8192):
+        self.num_threads = num_threads
+        self.token_budget = token_budget
+
+    def encode(self, documents: List[str]) -> Tuple[np.ndarray, EmbeddingStats]:
+        """Embed documents as normalized pseudo-random vectors in the input order."""
+        vectors = np.empty((len(documents), EMBEDDING_DIM), dtype=np.float32)
+        for row, document in enumerate(documents):
+            vectors[row] = np.random.default_rng(
+                zlib.crc32(document.encode())
+            ).standard_normal(EMBEDDING_DIM, dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors, EmbeddingStats(documents=len(documents))
+
+
+def _init_worker(
+    num_threads: int,
+    token_budget: int,
+    counter: Synchronized,
+    encoder: Callable[..., Union[Encoder, HashingEncoder]] = Encoder,
+) -> None:
+    """Pin a worker process to its own cores and load its encoder.
+
+    Args:
+        num_threads: Number of inference threads for the worker
+        token_budget: Maximum number of padded tokens per encoder batch
+        counter: Shared counter used to hand out a distinct core slot per worker
+        encoder: Encoder class
+
+    Returns:
+        None
+    """
+    global _encoder
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    with counter.get_lock():
+        slot = counter.value
+        counter.value += 1
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+        start = (slot * num_threads) % len(cores)
+        os.sched_setaffinity(0, cores[start : start + num_threads] or cores)
+    _encoder = encoder(num_threads=num_threads, token_budget=token_budget)
+
+
+def _embed_shard(
+    shm_name: str, total: int, rows: List[int], documents: List[str]
+) -> EmbeddingStats:
+    """Embed a shard of documents into a shared memory block.
+
+    Args:
+        shm_name: Name of the shared memory block holding the output array
+        total: Number of rows in the output array
+        rows: Row of each document in the output array
+        documents: Documents in the shard
+
+    Returns:
+        The encoder stats for the shard
+    """
+    if _encoder is None:
+        raise RuntimeError("worker not initialised")
+    vectors, stats = _encoder.encode(documents)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray((total, EMBEDDING_DIM), dtype=np.float32, buffer=shm.buf)
+        out[rows] = vectors
+        del out
+    finally:
+        shm.close()
+    return stats
+
+
+class EmbeddingPool:
+    """Pool of embedding worker processes, each owning its own encoder.
+
+    Documents are sharded across the workers and the vectors are written back
+    into shared memory rather than returned as pickled lists. Throughput and
+    padding waste are accumulated in `stats` and logged for every call.
+    Each worker loads an instance of `encoder`, by default the ONNX `Encoder`.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        threads: int = 1,
+        token_budget: int = 8192,
+        encoder: Callable[..., Union[Encoder, HashingEncoder]] = Encoder,
+    ):
+        self.workers = workers
+        self.threads = threads
+        self.token_budget = token_budget
+        self.encoder = encoder
+        self.stats = EmbeddingStats()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._encoder: Optional[Union[Encoder, HashingEncoder]] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            ctx = get_context("spawn")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(
+                    self.threads,
+                    self.token_budget,
+                    ctx.Value("i", 0),
+                    self.encoder,
+                ),
+            )
+        return self._executor
+
+    def embed(self, documents: List[str]) -> np.ndarray:
+        """Embed documents across the worker pool.
+
+        Args:
+            documents: List of documents to embed
+
+        Returns:
+            A (n, 384) float32 array of embeddings in the input order
+        """
+        if not documents:
+            return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        start_time = time.perf_counter()
+        if self.workers <= 1:
+            if self._encoder is None:
+                self._encoder = self.encoder(
+                    num_threads=self.threads, token_budget=self.token_budget
+                )
+            embeddings, stats = self._encoder.encode(documents)
+        else:
+            embeddings, stats = self._embed_sharded(documents)
+        stats.seconds = time.perf_counter() - start_time
+        self.stats.add(stats)
+        self.stats.seconds += stats.seconds
+        logger.info(
+            "Embedded batch",
+            extra={
+                "documents": stats.documents,
+                "encoder-batches": stats.batches,
+                "docs-per-second": round(stats.docs_per_second, 2),
+                "padding-waste": round(stats.padding_waste, 4),
+            },
+        )
+        return embeddings
+
+    def _embed_sharded(self, documents: List[str]) -> Tuple[np.ndarray, EmbeddingStats]:
+        """Embed documents across the worker processes."""
+        total = len(documents)
+        # Deal documents out longest first so every shard gets a similar workload
+        order = sorted(range(total), key=lambda idx: len(documents[idx]), reverse=True)
+        shards = [order[k :: self.workers] for k in range(min(self.workers, total))]
+        shm = shared_memory.SharedMemory(
+            create=True, size=total * EMBEDDING_DIM * np.dtype(np.float32).itemsize
+        )
+        try:
+            futures = [
+                self.executor.submit(
+                    _embed_shard,
+                    shm.name,
+                    total,
+                    rows,
+                    [documents[idx] for idx in rows],
+                )
+                for rows in shards
+            ]
+            # Report the shards that are queued or running as they finish
+            stats = EmbeddingStats()
+            remaining = len(futures)
+            metrics.set("embed_queue_depth", remaining)
+            for future in as_completed(futures):
+                stats.add(future.result())
+                remaining -= 1
+                metrics.set("embed_queue_depth", remaining)
+            out = np.ndarray((total, EMBEDDING_DIM), dtype=np.float32, buffer=shm.buf)
+            embeddings = out.copy()
+            del out
+            return embeddings, stats
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> "EmbeddingPool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
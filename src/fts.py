@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Full-text search utilities."""
+
+import sqlite3
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+import regex
+
+# Weight of the title column relative to the body in BM25 scoring
+TITLE_WEIGHT = 10.0
+
+
+class LexicalIndex:
+    """SQLite FTS5 index over legislation titles and body text.
+
+    The FTS table is contentless, so the text is indexed but not stored a
+    second time. `fts_files` maps each file name to its FTS row; re-indexing
+    a file deletes the terms of that row before inserting the new text under
+    the same rowid, which needs `contentless_delete` (SQLite 3.43 or newer).
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._init_db()
+
+    def _init_db(self) -> None:
+        """Initialize the database."""
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS fts_files (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    file_name TEXT UNIQUE
+                )
+            """
+            )
+            conn.execute(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(
+                    title, body, content='', contentless_delete=1,
+                    tokenize='porter unicode61'
+                )
+            """
+            )
+
+    @staticmethod
+    def to_match_query(query: str) -> str:
+        """Convert free text into an FTS5 query that matches all of its terms.
+
+        Each term is quoted, so punctuation in citations such as "H.R. 1234"
+        or "Section 8(a)" is not read as FTS5 query syntax.
+
+        Args:
+            query: Free-text query
+
+        Returns:
+            An FTS5 MATCH expression
+        """
+        return " ".join(f'"{term}"' for term in regex.findall(r"\w+", query))
+
+    # noinspection SqlResolve
+    def add_many(self, records: List[Dict[str, Any]]) -> None:
+        """Index or re-index parsed legislation records.
+
+        Args:
+            records: Parsed legislation records
+
+        Returns:
+            None
+        """
+        with sqlite3.connect(self.path) as conn:
+            for record in records:
+                row = conn.execute(
+                    "SELECT id FROM fts_files WHERE file_name = ?",
+                    (record["file_name"],),
+                ).fetchone()
+                if row is None:
+                    rowid = conn.execute(
+                        "INSERT INTO fts_files (file_name) VALUES (?)",
+                        (record["file_name"],),
+                    ).lastrowid
+                else:
+                    # Remove the terms of the previously indexed text
+                    rowid = row[0]
+                    conn.execute("DELETE FROM fts WHERE rowid = ?", (rowid,))
+                title = " ".join(
+                    record.get(key) or ""
+                    for key in ("dc_title", "official_title", "legis_num")
+                )
+                conn.execute(
+                    "INSERT INTO fts (rowid, title, body) VALUES (?, ?, ?)",
+                    (rowid, title, record.get("text", "")),
+                )
+
+    # noinspection SqlResolve
+    def search(self, query: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """Search the index with BM25 ranking.
+
+        Args:
+            query: Free-text query
+            limit: The maximum number of results to return
+
+        Returns:
+            Pairs of file name and BM25 score, best match first
+        """
+        match = self.to_match_query(query)
+        if not match:
+            return []
+        with sqlite3.connect(self.path) as conn:
+            cursor = conn.execute(
+                """
+                SELECT f.file_name, bm25(fts, ?, 1.0) AS score
+                FROM fts JOIN fts_files f ON f.id = fts.rowid
+                WHERE fts MATCH ?
+                ORDER BY score
+                LIMIT ?
+                """,
+                (TITLE_WEIGHT, match, limit),
+            )
+            # bm25() is lower for better matches, so flip the sign
+            return [(file_name, -score) for file_name, score in cursor]
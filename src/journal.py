@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Batch journal utilities."""
+
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+# Batch states, in the order a batch moves through them
+PENDING = "pending"
+STARTED = "started"
+EMBEDDED = "embedded"
+COMMITTED = "committed"
+
+
+class BatchJournal:
+    """Write-ahead journal of ingest batches.
+
+    A run records its whole batch plan before any work starts. Each batch
+    then moves from pending to started (intent), embedded and committed,
+    the last once the writer has stored all of its records. Embedded
+    batches are spooled to disk, so a restarted run re-writes them without
+    parsing or embedding them again, and skips committed batches entirely.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.db_path = path / "journal.sqlite3"
+        self._init_db()
+
+    def _init_db(self) -> None:
+        """Initialize the database."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    seed INTEGER,
+                    started_at TIMESTAMP,
+                    completed_at TIMESTAMP
+                )
+            """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS batches (
+                    run_id INTEGER,
+                    batch_index INTEGER,
+                    files TEXT,
+                    state TEXT,
+                    updated_at TIMESTAMP,
+                    PRIMARY KEY (run_id, batch_index)
+                )
+            """
+            )
+
+    # noinspection SqlResolve
+    def open_run(self) -> Optional[int]:
+        """Return the id of the latest run that has not completed, if any."""
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT id FROM runs WHERE completed_at IS NULL ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+            return row[0] if row else None
+
+    # noinspection SqlResolve
+    def start_run(self, batches: List[List[Path]], seed: int = 0) -> int:
+        """Record the batch plan of a new run.
+
+        Args:
+            batches: Files of each batch, in processing order
+            seed: Seed of the file order
+
+        Returns:
+            The run id
+        """
+        now = datetime.now().isoformat()
+        with sqlite3.connect(self.db_path) as conn:
+            run_id = conn.execute(
+                "INSERT INTO runs (seed, started_at) VALUES (?, ?)", (seed, now)
+            ).lastrowid
+            if run_id is None:
+                raise RuntimeError("Journal run was not inserted")
+            conn.executemany(
+                """
+                INSERT INTO batches (run_id, batch_index, files, state, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                [
+                    (run_id, i, json.dumps([str(f) for f in files]), PENDING, now)
+                    for i, files in enumerate(batches)
+                ],
+            )
+        return run_id
+
+    # noinspection SqlResolve
+    def batches(self, run_id: int) -> List[Tuple[int, List[Path], str]]:
+        """Return the batch plan of a run.
+
+        Args:
+            run_id: The run id
+
+        Returns:
+            The index, files and state of each batch, in processing order
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.execute(
+                """
+                SELECT batch_index, files, state FROM batches
+                WHERE run_id = ? ORDER BY batch_index
+                """,
+                (run_id,),
+            )
+            return [
+                (batch_index, [Path(f) for f in json.loads(files)], state)
+                for batch_index, files, state in cursor
+            ]
+
+    # noinspection SqlResolve
+    def mark(self, run_id: int, batch_indices: List[int], state: str) -> None:
+        """Move batches to a new state.
+
+        Args:
+            run_id: The run id
+            batch_indices: Indices of the batches
+            state: The new state
+
+        Returns:
+            None
+        """
+        now = datetime.now().isoformat()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                """
+                UPDATE batches SET state = ?, updated_at = ?
+                WHERE run_id = ? AND batch_index = ?
+                """,
+                [(state, now, run_id, i) for i in batch_indices],
+            )
+
+    def _spool_path(self, run_id: int, batch_index: int) -> Path:
+        return self.path / f"run-{run_id}-batch-{batch_index:06d}"
+
+    def spool(
+        self,
+        run_id: int,
+        batch_index: int,
+        records: List[Dict[str, Any]],
+        embeddings: np.ndarray,
+    ) -> None:
+        """Save the embedded records of a batch and mark it embedded.
+
+        The files are written under temporary names and renamed, so a batch is
+        only marked embedded once its spool is complete.
+
+        Args:
+            run_id: The run id
+            batch_index: Index of the batch
+            records: Parsed legislation records
+            embeddings: Embedding of each record
+
+        Returns:
+            None
+        """
+        path = self._spool_path(run_id, batch_index)
+        with open(path.with_suffix(".npy.tmp"), "wb") as f:
+            np.save(f, np.asarray(embeddings, dtype=np.float32))
+        path.with_suffix(".json.tmp").write_text(json.dumps(records, default=str))
+        path.with_suffix(".npy.tmp").replace(path.with_suffix(".npy"))
+        path.with_suffix(".json.tmp").replace(path.with_suffix(".json"))
+        self.mark(run_id, [batch_index], EMBEDDED)
+
+    def load_spool(
+        self, run_id: int, batch_index: int
+    ) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """Load the embedded records of a batch saved with `spool`."""
+        path = self._spool_path(run_id, batch_index)
+        records = json.loads(path.with_suffix(".json").read_text())
+        return records, np.load(path.with_suffix(".npy"))
+
+    def commit(self, run_id: int, batch_indices: List[int]) -> None:
+        """Mark batches committed and remove their spools."""
+        self.mark(run_id, batch_indices, COMMITTED)
+        for batch_index in batch_indices:
+            path = self._spool_path(run_id, batch_index)
+            path.with_suffix(".npy").unlink(missing_ok=True)
+            path.with_suffix(".json").unlink(missing_ok=True)
+
+    # noinspection SqlResolve
+    def finish_run(self, run_id: int) -> bool:
+        """Mark a run completed if all of its batches are committed.
+
+        Args:
+            run_id: The run id
+
+        Returns:
+            True if the run is completed, False otherwise
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            remaining = conn.execute(
+                "SELECT COUNT(*) FROM batches WHERE run_id = ? AND state != ?",
+                (run_id, COMMITTED),
+            ).fetchone()[0]
+            if remaining:
+                return False
+            conn.execute(
+                "UPDATE runs SET completed_at = ? WHERE id = ?",
+                (datetime.now().isoformat(), run_id),
+            )
+            return True
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Profiling utilities."""
+
+import cProfile
+import pstats
+import tracemalloc
+from functools import wraps
+from typing import Callable, Any
+
+from src.config import Config
+from src.logging import logger
+
+
+def profiled(main: Callable[[], Any]) -> Callable[[], Any]:
+    """Wrap an entry point so `--profile` runs it under cProfile and tracemalloc.
+
+    The reports are written to `out_dir` as `profile-<name>.prof` (for
+    snakeviz and friends), `profile-<name>.txt` (top functions by cumulative
+    time) and `memory-<name>.txt` (top allocation sites).
+
+    Args:
+        main: Entry point to wrap
+
+    Returns:
+        The wrapped entry point
+    """
+
+    @wraps(main)
+    def wrapper() -> Any:
+        config = Config()
+        if not config.profile:
+            return main()
+
+        name = main.__module__.rsplit(".", 1)[-1]
+        if main.__name__ != "main":
+            # Modules with several entry points, e.g. `export_main`
+            name = f"{name}-{main.__name__.removesuffix('_main')}"
+        config.out_dir.mkdir(parents=True, exist_ok=True)
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        try:
+            return profiler.runcall(main)
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            profiler.dump_stats(config.out_dir / f"profile-{name}.prof")
+            with open(config.out_dir / f"profile-{name}.txt", "w") as f:
+                stats = pstats.Stats(profiler, stream=f)
+                stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(50)
+            with open(config.out_dir / f"memory-{name}.txt", "w") as f:
+                f.write(f"Peak traced memory: {peak} bytes\n")
+                for stat in snapshot.statistics("lineno")[:50]:
+                    f.write(f"{stat}\n")
+            logger.info(
+                "Wrote profile reports",
+                extra={"out-dir": str(config.out_dir), "peak-memory": peak},
+            )
+
+    return wrapper
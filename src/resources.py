@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Resource limit utilities."""
+
+import math
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+
+def _read(path: Path) -> Optional[str]:
+    try:
+        return path.read_text().strip()
+    except OSError:
+        return None
+
+
+def _read_stat(path: Path) -> Dict[str, int]:
+    text = _read(path) or ""
+    return {
+        key: int(value)
+        for key, value in (line.split() for line in text.splitlines() if line)
+    }
+
+
+def cpu_quota(root: Path = CGROUP_ROOT) -> Optional[float]:
+    """Return the cgroup CPU quota in CPUs, or None if there is no quota.
+
+    Reads `cpu.max` (cgroup v2) or `cpu.cfs_quota_us` and `cpu.cfs_period_us`
+    (cgroup v1).
+    """
+    cpu_max = _read(root / "cpu.max")
+    if cpu_max is not None:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max":
+            return int(quota) / int(period or 100000)
+        return None
+    quota_us = _read(root / "cpu" / "cpu.cfs_quota_us")
+    period_us = _read(root / "cpu" / "cpu.cfs_period_us")
+    if quota_us is not None and period_us is not None and int(quota_us) > 0:
+        return int(quota_us) / int(period_us)
+    return None
+
+
+def effective_cpu_count(root: Path = CGROUP_ROOT) -> int:
+    """Return the number of CPUs this process can use.
+
+    Unlike `multiprocessing.cpu_count()`, this respects the CPU affinity mask
+    and container CPU quotas.
+    """
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    quota = cpu_quota(root)
+    if quota is not None:
+        count = min(count, math.ceil(quota))
+    return max(1, count)
+
+
+def memory_limit(root: Path = CGROUP_ROOT) -> int:
+    """Return the memory limit in bytes.
+
+    Reads `memory.max` (cgroup v2) or `memory.limit_in_bytes` (cgroup v1),
+    and falls back to the physical memory if there is no limit.
+    """
+    physical = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    limit = _read(root / "memory.max")
+    if limit is None:
+        limit = _read(root / "memory" / "memory.limit_in_bytes")
+    if limit is None or limit == "max":
+        return physical
+    # cgroup v1 reports an unlimited group as a huge number
+    return min(int(limit), physical)
+
+
+def memory_usage(root: Path = CGROUP_ROOT) -> int:
+    """Return the memory in use in bytes.
+
+    This is the working set of the cgroup (usage minus inactive page cache,
+    which the kernel can reclaim) when running in one, so it includes child
+    processes such as the embedding workers. Otherwise it is the resident set
+    size of this process.
+    """
+    usage = _read(root / "memory.current")
+    if usage is not None:
+        inactive = _read_stat(root / "memory.stat").get("inactive_file", 0)
+        return max(0, int(usage) - inactive)
+    usage = _read(root / "memory" / "memory.usage_in_bytes")
+    if usage is not None:
+        stat = _read_stat(root / "memory" / "memory.stat")
+        return max(0, int(usage) - stat.get("total_inactive_file", 0))
+    statm = _read(Path("/proc/self/statm"))
+    if statm is None:
+        return 0
+    return int(statm.split()[1]) * os.sysconf("SC_PAGE_SIZE")
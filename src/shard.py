@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Sharded vector store utilities."""
+
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    Dict,
+    Any,
+    Callable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+    cast,
+)
+
+import regex
+from chromadb import EmbeddingFunction, GetResult, QueryResult, Where
+from chromadb.api.types import IncludeEnum
+from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+from src.config import Config
+from src.logging import logger
+from src.vectorstore import LegislationVectorStore
+
+T = TypeVar("T")
+
+
+def shard_key(file_name: str, shard_by: str, num_shards: int = 8) -> str:
+    """Return the name of the shard a legislation file belongs to.
+
+    Args:
+        file_name: File name, e.g. "BILLS-118hr1234ih.xml"
+        shard_by: Either "congress" or "hash"
+        num_shards: Number of shards when sharding by hash
+
+    Returns:
+        The shard name, e.g. "congress-118" or "hash-03"
+    """
+    if shard_by == "congress":
+        match = regex.match(r"^BILLS-(\d{3})", file_name)
+        return f"congress-{match.group(1)}" if match else "congress-unknown"
+    if shard_by == "hash":
+        return f"hash-{zlib.crc32(file_name.encode()) % num_shards:02d}"
+    raise ValueError(f"Unknown shard key: {shard_by}")
+
+
+class ShardedCollection:
+    """Fan-out view of the collections of several shards.
+
+    Implements the parts of the Chroma collection API used by search, so
+    the search functions work unchanged on a sharded store.
+    """
+
+    def __init__(self, store: "ShardedVectorStore"):
+        self.store = store
+
+    def count(self) -> int:
+        return sum(self.store.map(lambda shard: shard.collection.count()))
+
+    def query(
+        self,
+        query_texts: Optional[List[str]] = None,
+        query_embeddings: Optional[Any] = None,
+        n_results: int = 10,
+        where: Optional[Where] = None,
+        include: Sequence[IncludeEnum] = (
+            IncludeEnum.metadatas,
+            IncludeEnum.documents,
+            IncludeEnum.distances,
+        ),
+    ) -> QueryResult:
+        """Query every shard in parallel and merge the top-k of each query.
+
+        The query is embedded once and every shard returns its own top-k,
+        so the merged results are the exact top-k of the union. Distances
+        are comparable because every shard uses the same embedding function.
+        """
+        if query_embeddings is None:
+            query_embeddings = self.store.embedding_function(query_texts or [])
+        include = list(dict.fromkeys([*include, IncludeEnum.distances]))
+        results = [
+            cast(Dict[str, Any], result)
+            for result in self.store.map(
+                lambda shard: shard.collection.query(
+                    query_embeddings=query_embeddings,
+                    n_results=n_results,
+                    where=where,
+                    include=list(include),
+                )
+            )
+        ]
+        merged: Dict[str, Any] = {"ids": [], **{key.value: [] for key in include}}
+        for i in range(len(query_embeddings)):
+            hits = sorted(
+                (
+                    (result["distances"][i][j], shard, j)
+                    for shard, result in enumerate(results)
+                    for j in range(len(result["ids"][i]))
+                ),
+                key=lambda hit: hit[0],
+            )[:n_results]
+            for key in merged:
+                merged[key].append([results[shard][key][i][j] for _, shard, j in hits])
+        return cast(QueryResult, merged)
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        include: Sequence[IncludeEnum] = (IncludeEnum.metadatas, IncludeEnum.documents),
+    ) -> GetResult:
+        """Fetch records by id from the shards that own them.
+
+        Without a shard key the lookup fans out to every selected shard.
+        """
+        ids = ids or []
+        if self.store.config.shard_by:
+            by_shard: Dict[str, List[str]] = {}
+            for idx in ids:
+                by_shard.setdefault(self.store.shard_for(idx), []).append(idx)
+        else:
+            by_shard = {name: ids for name in self.store.names}
+        results = self.store.map(
+            lambda shard: shard.collection.get(
+                ids=by_shard[self.store.name_of(shard)], include=list(include)
+            ),
+            [name for name in self.store.names if by_shard.get(name)],
+        )
+        merged: Dict[str, Any] = {"ids": [], **{key.value: [] for key in include}}
+        for result in results:
+            for key in merged:
+                merged[key].extend(cast(Dict[str, Any], result)[key] or [])
+        return cast(GetResult, merged)
+
+
+class ShardedLexicalIndex:
+    """Fan-out view of the full-text indexes of several shards."""
+
+    def __init__(self, store: "ShardedVectorStore"):
+        self.store = store
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """Search every shard in parallel and merge the best matches.
+
+        BM25 statistics are per shard, so scores are only approximately
+        comparable across shards.
+        """
+        hits = [
+            hit
+            for shard_hits in self.store.map(
+                lambda shard: shard.lexical_index.search(query, limit)
+            )
+            for hit in shard_hits
+        ]
+        return sorted(hits, key=lambda hit: hit[1], reverse=True)[:limit]
+
+
+class ShardedVectorStore:
+    """Vector store partitioned into one store directory per shard.
+
+    Each shard is a complete `LegislationVectorStore` in
+    `db_dir/shards/<name>`, with its own SQLite databases, so shards can be
+    written by separate processes. Queries fan out to the selected shards in
+    parallel and the results are merged.
+    """
+
+    def __init__(
+        self,
+        config: Config = Config(),
+        embedding_function: Optional[EmbeddingFunction] = None,
+    ):
+        self.config = config
+        self.shards_dir = Path(config.db_dir) / "shards"
+        self.embedding_function = cast(
+            EmbeddingFunction, embedding_function or DefaultEmbeddingFunction()
+        )
+        self.names = config.shards or sorted(
+            path.name for path in self.shards_dir.glob("*") if path.is_dir()
+        )
+        self._stores: Dict[str, LegislationVectorStore] = {}
+        self.collection = ShardedCollection(self)
+        self.lexical_index = ShardedLexicalIndex(self)
+
+    def shard_for(self, file_name: str) -> str:
+        """Return the name of the shard a legislation file belongs to."""
+        return shard_key(file_name, self.config.shard_by, self.config.num_shards)
+
+    def shard_config(self, name: str) -> Config:
+        """Return the configuration of a shard's store."""
+        return self.config.model_copy(update={"db_dir": self.shards_dir / name})
+
+    def shard(self, name: str) -> LegislationVectorStore:
+        """Open a shard's store, creating it if it does not exist."""
+        if name not in self._stores:
+            config = self.shard_config(name)
+            config.db_dir.mkdir(parents=True, exist_ok=True)
+            self._stores[name] = LegislationVectorStore(
+                config=config, embedding_function=self.embedding_function
+            )
+        return self._stores[name]
+
+    def name_of(self, shard: LegislationVectorStore) -> str:
+        return shard.db_dir.name
+
+    def get_texts(self, metadatas: List[Mapping[str, Any]]) -> List[str]:
+        """Fetch the document text of search or get results from their shards.
+
+        Args:
+            metadatas: Metadata of the documents
+
+        Returns:
+            The text of each document, or an empty string if it is not stored
+        """
+        texts = [""] * len(metadatas)
+        for name in self.names:
+            # Without a shard key every shard is asked for every document
+            rows = [
+                row
+                for row, m in enumerate(metadatas)
+                if not self.config.shard_by or self.shard_for(m["file_name"]) == name
+            ]
+            if not rows:
+                continue
+            shard_texts = self.shard(name).get_texts([metadatas[row] for row in rows])
+            for row, text in zip(rows, shard_texts):
+                texts[row] = texts[row] or text
+        return texts
+
+    def partition(self, files: List[Path]) -> Dict[str, List[Path]]:
+        """Group files by the shard they belong to."""
+        partitions: Dict[str, List[Path]] = {}
+        for file in files:
+            partitions.setdefault(self.shard_for(file.name), []).append(file)
+        return partitions
+
+    def map(
+        self,
+        fn: Callable[[LegislationVectorStore], T],
+        names: Optional[List[str]] = None,
+    ) -> List[T]:
+        """Call a function on each selected shard in parallel.
+
+        Args:
+            fn: Function called with the store of each shard
+            names: Shards to call, defaults to all selected shards
+
+        Returns:
+            The result for each shard, in order
+        """
+        names = self.names if names is None else names
+        if not names:
+            return []
+        stores = [self.shard(name) for name in names]
+        with ThreadPoolExecutor(max_workers=len(stores)) as executor:
+            return list(executor.map(fn, stores))
+
+
+# Either kind of store can be searched
+AnyVectorStore = Union[LegislationVectorStore, ShardedVectorStore]
+
+
+def merge_shards(
+    store: ShardedVectorStore,
+    target: LegislationVectorStore,
+    page_size: int = 1000,
+) -> int:
+    """Merge the selected shards into a single store.
+
+    Records are copied with their stored embeddings, so nothing is
+    re-embedded, along with the processed file state.
+
+    Args:
+        store: The sharded store to merge
+        target: The store to merge into
+        page_size: Number of records per page
+
+    Returns:
+        The number of records merged
+    """
+    merged = 0
+    for name in store.names:
+        shard = store.shard(name)
+        for ids, embeddings, metadatas, texts in shard.iter_records(page_size):
+            target.add_records(ids, embeddings, metadatas, texts)
+            merged += len(ids)
+        for rows in shard.iter_processed_files(page_size):
+            target.restore_processed_files(rows)
+        logger.info("Merged shard", extra={"shard": name, "records": merged})
+    return merged
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Synthetic legislation corpus generator."""
+
+import random
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+from lxml import etree as ElementTree
+from lxml.etree import Element, SubElement
+
+DC_NAMESPACE = "http://purl.org/dc/elements/1.1/"
+
+# fmt: off
+WORDS = [
+    "act", "agency", "amended", "appropriations", "authority", "benefits",
+    "code", "commerce", "committee", "congress", "covered", "department",
+    "described", "eligible", "entity", "federal", "fiscal", "funds", "grant",
+    "health", "individual", "law", "local", "made", "national", "paragraph",
+    "program", "provided", "public", "purposes", "report", "required",
+    "secretary", "section", "services", "shall", "state", "striking",
+    "subsection", "such", "term", "title", "united", "year",
+]
+# fmt: on
+
+# Short codes, chamber and document type of each legislation type
+LEGISLATION_TYPES = {
+    "hconres": ("H", "resolution", "CONCURRENT RESOLUTION"),
+    "hjres": ("H", "resolution", "JOINT RESOLUTION"),
+    "hr": ("H", "bill", "A BILL"),
+    "hres": ("H", "resolution", "RESOLUTION"),
+    "s": ("S", "bill", "A BILL"),
+    "sconres": ("S", "resolution", "CONCURRENT RESOLUTION"),
+    "sjres": ("S", "resolution", "JOINT RESOLUTION"),
+    "sres": ("S", "resolution", "RESOLUTION"),
+}
+
+STATUSES = ["ih", "is", "rh", "rs", "eh", "es", "enr"]
+
+
+class SyntheticBillGenerator:
+    """Generate bill XML files that follow the schema of the bulk data files.
+
+    Each file has the root attributes, Dublin Core metadata, `form` block and
+    a body of nested sections and subsections read by `XMLParser`. Output is
+    deterministic for a given seed.
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        sections: int = 5,
+        subsections: int = 3,
+        words_per_paragraph: int = 60,
+    ):
+        # Deterministic fixture RNG, not used for anything security-sensitive
+        self.random = random.Random(seed)  # nosec B311
+        self.sections = sections
+        self.subsections = subsections
+        self.words_per_paragraph = words_per_paragraph
+
+    def _sentence(self, words: int) -> str:
+        text = " ".join(self.random.choices(WORDS, k=words))
+        return text[0].upper() + text[1:] + "."
+
+    def _id(self) -> str:
+        return "H" + uuid.UUID(int=self.random.getrandbits(128)).hex.upper()
+
+    def file_name(
+        self, congress: int, legislation_type: str, number: int, status: str
+    ) -> str:
+        return f"BILLS-{congress}{legislation_type}{number}{status}.xml"
+
+    def generate(
+        self,
+        congress: int = 118,
+        legislation_type: str = "hr",
+        number: int = 1,
+        status: str = "ih",
+    ) -> Element:
+        """Generate the root element of a single legislation document.
+
+        Args:
+            congress: Congress number
+            legislation_type: Legislation type short code, e.g. "hr"
+            number: Legislation number
+            status: Legislation version code, e.g. "ih"
+
+        Returns:
+            The root element of the document
+        """
+        chamber, kind, legis_type = LEGISLATION_TYPES[legislation_type]
+        title = self._sentence(self.random.randint(6, 16))
+        legis_num = (
+            f"{chamber}. {legislation_type[1:].upper()}. {number}"
+            if len(legislation_type) > 1
+            else f"{chamber}. {number}"
+        )
+
+        root = Element(
+            kind,
+            {
+                f"{kind}-stage": "Introduced-in-House",
+                "dms-id": self._id(),
+                "public-private": "public",
+                f"{kind}-type": "olc",
+            },
+        )
+        metadata = SubElement(root, "metadata", nsmap={"dc": DC_NAMESPACE})
+        dublin_core = SubElement(metadata, "dublinCore")
+        for name, value in [
+            (
+                "title",
+                f"{congress} {legislation_type.upper()} {number} {status.upper()}: {title}",
+            ),
+            ("publisher", "U.S. House of Representatives"),
+            ("date", f"{2000 + (congress - 106) * 2}-01-03"),
+            ("format", "text/xml"),
+            ("language", "EN"),
+            (
+                "rights",
+                "Pursuant to Title 17 Section 105 of the United States Code, this file is not subject to copyright protection and is in the public domain.",
+            ),
+        ]:
+            SubElement(dublin_core, f"{{{DC_NAMESPACE}}}{name}").text = value
+
+        form = SubElement(root, "form")
+        SubElement(form, "distribution-code").text = "I"
+        SubElement(form, "congress").text = f"{congress}th CONGRESS"
+        SubElement(form, "session").text = "1st Session"
+        SubElement(form, "legis-num").text = legis_num
+        SubElement(form, "current-chamber").text = "IN THE HOUSE OF REPRESENTATIVES"
+        action = SubElement(form, "action")
+        SubElement(action, "action-date").text = "January 3, 2023"
+        SubElement(action, "action-desc").text = self._sentence(12)
+        SubElement(form, "legis-type").text = legis_type
+        SubElement(form, "official-title").text = title
+
+        body = SubElement(root, f"{kind}-body", {"id": self._id()})
+        for section_idx in range(1, self.sections + 1):
+            section = SubElement(body, "section", {"id": self._id()})
+            SubElement(section, "enum").text = f"{section_idx}."
+            SubElement(section, "header").text = self._sentence(4)
+            SubElement(section, "text").text = self._sentence(self.words_per_paragraph)
+            for subsection_idx in range(self.subsections):
+                subsection = SubElement(section, "subsection", {"id": self._id()})
+                SubElement(subsection, "enum").text = f"({chr(97 + subsection_idx)})"
+                SubElement(subsection, "text").text = self._sentence(
+                    self.words_per_paragraph
+                )
+        return root
+
+    def write_corpus(
+        self,
+        out_dir: Path,
+        count: int,
+        versions: int = 1,
+        congresses: Optional[List[int]] = None,
+    ) -> List[Path]:
+        """Write a corpus of synthetic legislation files.
+
+        Args:
+            out_dir: Directory to write the files to
+            count: Number of distinct legislation items
+            versions: Number of versions (statuses) written per item
+            congresses: Congresses to draw from, defaults to 114-118
+
+        Returns:
+            Paths of the written files
+        """
+        congresses = congresses or [114, 115, 116, 117, 118]
+        out_dir.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for number in range(1, count + 1):
+            congress = self.random.choice(congresses)
+            legislation_type = self.random.choice(list(LEGISLATION_TYPES))
+            for status in STATUSES[:versions]:
+                root = self.generate(congress, legislation_type, number, status)
+                path = out_dir / self.file_name(
+                    congress, legislation_type, number, status
+                )
+                ElementTree.ElementTree(root).write(
+                    str(path), xml_declaration=True, encoding="UTF-8"
+                )
+                paths.append(path)
+        return paths
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""HNSW index benchmark."""
+
+import itertools
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+import numpy as np
+from chromadb import PersistentClient
+from chromadb.api.client import SharedSystemClient
+
+from src.config import Config
+from src.logging import logger
+from src.profiling import profiled
+from src.task.similar import normalize
+from src.vectorstore import LegislationVectorStore
+
+
+def exact_topk(
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    space: str = "l2",
+    block_size: int = 1024,
+) -> np.ndarray:
+    """Find the exact k nearest corpus rows of each query by brute force.
+
+    Args:
+        corpus: (m, d) corpus embeddings
+        queries: (n, d) query embeddings
+        k: Number of neighbors
+        space: Distance metric, one of "l2", "cosine" or "ip"
+        block_size: Number of queries scored at a time
+
+    Returns:
+        The (n, k) corpus rows of the nearest neighbors, nearest first
+    """
+    if space == "cosine":
+        corpus, queries = normalize(corpus), normalize(queries)
+    squared_norms = (corpus**2).sum(axis=1)
+    neighbors = []
+    for start in range(0, len(queries), block_size):
+        scores = queries[start : start + block_size] @ corpus.T
+        if space == "l2":
+            # Larger is nearer; the squared norm of the query does not change the order
+            scores = 2 * scores - squared_norms
+        elif space not in ("cosine", "ip"):
+            raise ValueError(f"Unknown space: {space}")
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        neighbors.append(np.take_along_axis(top, order, axis=1))
+    return np.concatenate(neighbors)
+
+
+def directory_size(path: Path) -> int:
+    """Return the total size of the files under a directory in bytes."""
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def bench_index(
+    ids: List[str],
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    work_dir: Path,
+    space: str,
+    m: int,
+    ef_construction: int,
+    ef_search: int,
+    batch_size: int = 1000,
+) -> Dict[str, Any]:
+    """Build an index with the given settings and measure it against the exact neighbors.
+
+    Args:
+        ids: Id of each corpus row
+        corpus: (m, d) corpus embeddings
+        queries: (n, d) query embeddings
+        truth: (n, k) exact nearest corpus rows of each query
+        work_dir: Directory in which the index is built
+        space: Distance metric
+        m: Maximum number of graph links per node
+        ef_construction: Candidate list size while building
+        ef_search: Candidate list size while searching
+        batch_size: Number of embeddings added at a time
+
+    Returns:
+        Build time, index size, query latency percentiles and recall@k
+    """
+    path = work_dir / f"{space}-m{m}-efc{ef_construction}-efs{ef_search}"
+    client = PersistentClient(str(path))
+    collection = client.create_collection(
+        name="legislation",
+        metadata={
+            "hnsw:space": space,
+            "hnsw:M": m,
+            "hnsw:construction_ef": ef_construction,
+            "hnsw:search_ef": ef_search,
+        },
+    )
+    start = time.perf_counter()
+    for i in range(0, len(ids), batch_size):
+        collection.add(
+            ids=ids[i : i + batch_size], embeddings=corpus[i : i + batch_size]
+        )
+    build_s = time.perf_counter() - start
+
+    k = truth.shape[1]
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query], n_results=k, include=[])
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(result["ids"][0]) & {ids[row] for row in expected})
+
+    # The HNSW files live in one directory per segment, next to chroma.sqlite3
+    index_bytes = sum(directory_size(d) for d in path.iterdir() if d.is_dir())
+    # Release the index before deleting it; this closes every open client
+    SharedSystemClient.clear_system_cache()
+    shutil.rmtree(path)
+    return {
+        "space": space,
+        "m": m,
+        "ef_construction": ef_construction,
+        "ef_search": ef_search,
+        "documents": len(ids),
+        "build_s": build_s,
+        "index_bytes": index_bytes,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        f"recall_at_{k}": hits / (len(queries) * k),
+    }
+
+
+@profiled
+def main():
+    config = Config()
+    vectorstore = LegislationVectorStore(config=config)
+    ids: List[str] = []
+    pages = []
+    for page_ids, embeddings, _ in vectorstore.iter_embeddings(config.page_size):
+        ids.extend(page_ids)
+        pages.append(embeddings)
+    if not ids:
+        raise ValueError("No embeddings to benchmark")
+    embeddings = np.concatenate(pages)
+    if len(embeddings) < 2:
+        raise ValueError("Need at least two embeddings to benchmark")
+    # Hold the queries out of the index, or each would find itself and inflate recall
+    rng = np.random.default_rng(config.seed)
+    held_out = np.zeros(len(embeddings), dtype=bool)
+    held_out[
+        rng.choice(
+            len(embeddings),
+            min(config.bench_queries, len(embeddings) - 1),
+            replace=False,
+        )
+    ] = True
+    queries = embeddings[held_out]
+    corpus = embeddings[~held_out]
+    ids = [id_ for id_, held in zip(ids, held_out) if not held]
+    k = min(config.bench_k, len(corpus))
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for space in config.bench_spaces:
+            truth = exact_topk(corpus, queries, k, space)
+            for m, ef_construction, ef_search in itertools.product(
+                config.bench_m, config.bench_ef_construction, config.bench_ef_search
+            ):
+                result = bench_index(
+                    ids,
+                    corpus,
+                    queries,
+                    truth,
+                    Path(work_dir),
+                    space,
+                    m,
+                    ef_construction,
+                    ef_search,
+                    batch_size=config.write_batch_size,
+                )
+                logger.info("Index benchmark", extra=result)
+                results.append(result)
+
+    bench_dir = config.out_dir / "benchmarks"
+    bench_dir.mkdir(parents=True, exist_ok=True)
+    (bench_dir / "index.json").write_text(json.dumps(results, indent=2))
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Benchmark suite."""
+
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import umap
+from chromadb import Documents, EmbeddingFunction, Embeddings
+
+from src.config import Config
+from src.embedding import EmbeddingStats, HashingEncoder
+from src.logging import logger
+from src.profiling import profiled
+from src.synthetic import LEGISLATION_TYPES, STATUSES, SyntheticBillGenerator
+from src.task.outlier import find_most_isolated_points
+from src.task.processor import DataProcessor
+from src.task.reducer import Reducer
+from src.task.search import hybrid_search, lexical_search, search
+from src.task.snapshot import export_snapshot, import_snapshot
+from src.vectorstore import LegislationVectorStore
+from src.xml import XMLParser
+
+QUERIES = [
+    "appropriations for the department of health",
+    "national grant program",
+    "amended by striking subsection",
+    "federal agency report required",
+    "eligible individual benefits",
+]
+
+
+class HashingEmbedder(EmbeddingFunction[Documents]):
+    """Deterministic stand-in for the encoder.
+
+    Vectors are seeded from a hash of the text, so everything except model
+    inference can be benchmarked without downloading or running the model.
+    """
+
+    def __init__(self):
+        self.stats = EmbeddingStats()
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return list(self.embed(list(input)))
+
+    def embed(self, documents: List[str]) -> np.ndarray:
+        vectors, stats = HashingEncoder().encode(documents)
+        self.stats.add(stats)
+        return vectors
+
+    def close(self) -> None:
+        pass
+
+
+def measure(
+    fn: Callable[[Any], Any],
+    repeat: int,
+    items: int,
+    setup: Optional[Callable[[], Any]] = None,
+) -> Dict[str, float]:
+    """Time a function over several repeats.
+
+    Args:
+        fn: Function to time, called with the result of `setup`
+        repeat: Number of timed runs
+        items: Number of items handled per run, used for the throughput
+        setup: Untimed function called before each run
+
+    Returns:
+        Timing statistics in seconds and items per second
+    """
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {
+        "items": items,
+        "repeat": repeat,
+        "min_s": min(times),
+        "median_s": median,
+        "items_per_second": items / median if median > 0 else 0.0,
+    }
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+) -> List[str]:
+    """Find benchmarks that regressed against the baseline.
+
+    Args:
+        results: Current benchmark results
+        baseline: Baseline benchmark results
+        threshold: Allowed relative slowdown of the median time, e.g. 0.25
+
+    Returns:
+        Names of the benchmarks whose median time exceeds the allowed slowdown
+    """
+    return [
+        name
+        for name, result in results.items()
+        if name in baseline
+        and result["median_s"] > baseline[name]["median_s"] * (1 + threshold)
+    ]
+
+
+class BenchmarkSuite:
+    """Benchmarks of the ingest, search and analysis code on a synthetic corpus."""
+
+    def __init__(self, config: Config, work_dir: Path):
+        self.config = config
+        self.work_dir = work_dir
+        self.repeat = config.bench_repeat
+        generator = SyntheticBillGenerator(seed=0, sections=config.bench_sections)
+        self.files = generator.write_corpus(work_dir / "data", config.bench_docs)
+        self._stores = 0
+
+    def _config(self) -> Config:
+        """Return a config pointing at a fresh store in the work directory."""
+        self._stores += 1
+        return self.config.model_copy(
+            update={
+                "data_dir": self.work_dir / "data",
+                "db_dir": self.work_dir / f"embeddings-{self._stores}",
+            }
+        )
+
+    def _processor(self) -> DataProcessor:
+        config = self._config()
+        config.db_dir.mkdir(parents=True)
+        return DataProcessor(
+            config=config,
+            vectorstore=LegislationVectorStore(
+                config=config, embedding_function=HashingEmbedder()
+            ),
+            embedder=HashingEmbedder(),
+        )
+
+    @staticmethod
+    def _process(processor: DataProcessor, files: List[Path]) -> None:
+        processor.process_batch(files)
+        processor.writer.flush()
+
+    def bench_parse_file(self) -> Dict[str, float]:
+        parser = XMLParser()
+        return measure(
+            lambda _: [parser.parse_file(path) for path in self.files],
+            self.repeat,
+            len(self.files),
+        )
+
+    def bench_dedupe(self) -> Dict[str, float]:
+        processor = self._processor()
+        paths = [
+            Path(f"BILLS-{congress}{legislation_type}{number}{status}.xml")
+            for congress in range(114, 119)
+            for legislation_type in LEGISLATION_TYPES
+            for number in range(1, self.config.bench_docs + 1)
+            for status in STATUSES[:3]
+        ]
+        return measure(
+            lambda _: processor._dedupe_legislation(paths), self.repeat, len(paths)
+        )
+
+    def bench_process_batch(self) -> Dict[str, float]:
+        return measure(
+            lambda processor: self._process(processor, self.files),
+            self.repeat,
+            len(self.files),
+            setup=self._processor,
+        )
+
+    def bench_search(self, store: LegislationVectorStore) -> Dict[str, float]:
+        return measure(
+            lambda _: [search(query, vectorstore=store) for query in QUERIES],
+            self.repeat,
+            len(QUERIES),
+        )
+
+    def bench_citation_search(
+        self, store: LegislationVectorStore
+    ) -> Dict[str, Dict[str, float]]:
+        """Latency and recall@5 of each search mode on citation-style queries."""
+        parser = XMLParser()
+        queries = []
+        for path in self.files[:: max(1, len(self.files) // 20)]:
+            parsed = parser.parse_file(path)
+            queries.append((parsed["legis_num"], parsed["file_name"]))
+
+        results = {}
+        for mode, search_fn in [
+            ("vector", search),
+            ("lexical", lexical_search),
+            ("hybrid", hybrid_search),
+        ]:
+            result = measure(
+                lambda _: [search_fn(q, vectorstore=store) for q, _ in queries],
+                self.repeat,
+                len(queries),
+            )
+            hits = sum(
+                expected in [m["file_name"] for m in search_fn(q, vectorstore=store)]
+                for q, expected in queries
+            )
+            result["recall_at_5"] = hits / len(queries)
+            results[f"citation_search_{mode}"] = result
+        return results
+
+    def bench_snapshot_import(self, store: LegislationVectorStore) -> Dict[str, float]:
+        path = self.work_dir / "snapshot"
+        export_snapshot(store, path)
+
+        def setup() -> LegislationVectorStore:
+            config = self._config()
+            return LegislationVectorStore(
+                config=config, embedding_function=HashingEmbedder()
+            )
+
+        return measure(
+            lambda target: import_snapshot(target, path),
+            self.repeat,
+            len(self.files),
+            setup=setup,
+        )
+
+    def bench_reducer(self, store: LegislationVectorStore) -> Dict[str, float]:
+        return measure(
+            lambda reducer: reducer.process(),
+            self.repeat,
+            len(self.files),
+            setup=lambda: Reducer(
+                vectorstore=store,
+                reducer=umap.UMAP(
+                    n_neighbors=10, n_components=2, min_dist=0.0, random_state=0
+                ),
+            ),
+        )
+
+    def bench_outlier(self) -> Dict[str, float]:
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame(
+            rng.standard_normal((self.config.bench_docs * 10, 2)), columns=["0", "1"]
+        )
+        return measure(lambda _: find_most_isolated_points(df), self.repeat, len(df))
+
+    def run(self) -> Dict[str, Dict[str, float]]:
+        """Run all benchmarks.
+
+        Returns:
+            Timing statistics per benchmark
+        """
+        processor = self._processor()
+        self._process(processor, self.files)
+        store = processor.vectorstore
+        results = {
+            "parse_file": self.bench_parse_file(),
+            "dedupe": self.bench_dedupe(),
+            "process_batch": self.bench_process_batch(),
+            "search": self.bench_search(store),
+            **self.bench_citation_search(store),
+            "snapshot_import": self.bench_snapshot_import(store),
+            "reducer": self.bench_reducer(store),
+            "outlier": self.bench_outlier(),
+        }
+        for name, result in results.items():
+            logger.info("Benchmark", extra={"benchmark": name, **result})
+        return results
+
+
+@profiled
+def main():
+    config = Config()
+    bench_dir = config.out_dir / "benchmarks"
+    bench_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = BenchmarkSuite(config, Path(work_dir)).run()
+    (bench_dir / "results.json").write_text(json.dumps(results, indent=2))
+
+    baseline_path = bench_dir / "baseline.json"
+    if config.bench_update or not baseline_path.exists():
+        baseline_path.write_text(json.dumps(results, indent=2))
+        logger.info("Wrote benchmark baseline", extra={"path": str(baseline_path)})
+        return
+
+    baseline = json.loads(baseline_path.read_text())
+    regressions = compare(results, baseline, config.bench_threshold)
+    if regressions:
+        logger.error(
+            "Benchmark regressions",
+            extra={"benchmarks": regressions, "threshold": config.bench_threshold},
+        )
+        sys.exit(1)
+    logger.info("No benchmark regressions", extra={"threshold": config.bench_threshold})
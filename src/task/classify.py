@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Topic classification."""
+
+import json
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from chromadb.api.types import IncludeEnum, Metadata
+from inflection import underscore
+from sklearn.linear_model import SGDClassifier
+
+from src.config import Config
+from src.logging import logger
+from src.profiling import profiled
+from src.vectorstore import LegislationVectorStore
+
+
+def topic_key(topic: str) -> str:
+    """Return the metadata key of a topic's probability, e.g. "topic_national_security"."""
+    return f"topic_{underscore(topic.replace(' ', '_'))}"
+
+
+class TopicClassifier:
+    """Linear one-vs-rest topic classifier over embeddings.
+
+    Only the weights are stored, so scoring a batch is a single matrix
+    product and can run inline while ingesting.
+    """
+
+    def __init__(self, topics: List[str], coef: np.ndarray, intercept: np.ndarray):
+        self.topics = topics
+        self.coef = np.asarray(coef, dtype=np.float32)
+        self.intercept = np.asarray(intercept, dtype=np.float32)
+
+    def predict_proba(self, embeddings: np.ndarray) -> np.ndarray:
+        """Score embeddings against every topic.
+
+        Args:
+            embeddings: (n, d) embeddings
+
+        Returns:
+            The (n, topics) probability of each topic, normalized per row
+        """
+        scores = np.asarray(embeddings, dtype=np.float32) @ self.coef.T
+        probabilities = 1 / (1 + np.exp(-(scores + self.intercept)))
+        if len(self.topics) == 2:
+            # Binary models have a single weight vector for the second topic
+            return np.hstack([1 - probabilities, probabilities])
+        return probabilities / np.clip(
+            probabilities.sum(axis=1, keepdims=True), 1e-12, None
+        )
+
+    def metadatas(self, embeddings: np.ndarray) -> List[Metadata]:
+        """Score embeddings and return the metadata to store with each document.
+
+        Args:
+            embeddings: (n, d) embeddings
+
+        Returns:
+            The most likely topic and the probability of every topic
+        """
+        if len(embeddings) == 0:
+            return []
+        probabilities = self.predict_proba(embeddings)
+        keys = [topic_key(topic) for topic in self.topics]
+        return [
+            {
+                "topic": self.topics[int(np.argmax(row))],
+                **{key: round(float(p), 4) for key, p in zip(keys, row)},
+            }
+            for row in probabilities
+        ]
+
+    def save(self, path: Path) -> None:
+        """Save the model to a directory."""
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "coef.npy", self.coef)
+        np.save(path / "intercept.npy", self.intercept)
+        (path / "model.json").write_text(json.dumps({"topics": self.topics}))
+
+    @classmethod
+    def load(cls, path: Path) -> "TopicClassifier":
+        """Load a model saved with `save`."""
+        meta = json.loads((path / "model.json").read_text())
+        return cls(
+            meta["topics"],
+            np.load(path / "coef.npy"),
+            np.load(path / "intercept.npy"),
+        )
+
+
+def load_labels(
+    vectorstore: LegislationVectorStore, topics: List[str], path: Path
+) -> Dict[str, int]:
+    """Collect the labeled examples of each topic.
+
+    Labels are read from the output of `label` if it exists, otherwise the
+    collection is queried for the most similar legislation to each topic,
+    as `label` does. Legislation with several labels keeps the first one.
+
+    Args:
+        vectorstore: The vector store to query
+        topics: Topic names
+        path: Path of the labeled embeddings CSV
+
+    Returns:
+        A mapping of legislation id to topic index
+    """
+    labels: Dict[str, int] = {}
+    if path.exists():
+        df = pd.read_csv(path)
+        for topic_idx, topic in enumerate(topics):
+            if topic in df.columns:
+                for idx in df.loc[df[topic] == 1, "id"]:
+                    labels.setdefault(idx, topic_idx)
+        return labels
+    results = vectorstore.collection.query(query_texts=topics, n_results=10, include=[])
+    for topic_idx, ids in enumerate(results["ids"]):
+        for idx in ids:
+            labels.setdefault(idx, topic_idx)
+    return labels
+
+
+def train(
+    vectorstore: LegislationVectorStore,
+    topics: List[str],
+    labels: Dict[str, int],
+    page_size: int = 1000,
+    epochs: int = 20,
+    seed: int = 0,
+) -> TopicClassifier:
+    """Train a logistic regression classifier with `partial_fit` over pages of labeled embeddings.
+
+    Args:
+        vectorstore: The vector store to read embeddings from
+        topics: Topic names
+        labels: Mapping of legislation id to topic index
+        page_size: Number of embeddings per page
+        epochs: Number of passes over the labeled embeddings
+        seed: Seed of the shuffle order
+
+    Returns:
+        The trained classifier
+    """
+    if not labels:
+        raise ValueError("No labeled legislation to train on")
+    classifier = SGDClassifier(loss="log_loss", random_state=seed)
+    classes = np.arange(len(topics))
+    ids = sorted(labels)
+    rng = np.random.default_rng(seed)
+    for _ in range(epochs):
+        rng.shuffle(ids)
+        for start in range(0, len(ids), page_size):
+            result = vectorstore.collection.get(
+                ids=ids[start : start + page_size], include=[IncludeEnum.embeddings]
+            )
+            classifier.partial_fit(
+                np.asarray(result["embeddings"], dtype=np.float32),
+                np.array([labels[idx] for idx in result["ids"]]),
+                classes=classes,
+            )
+    return TopicClassifier(topics, classifier.coef_, classifier.intercept_)
+
+
+def classify_all(
+    model: TopicClassifier,
+    vectorstore: LegislationVectorStore,
+    page_size: int = 1000,
+) -> np.ndarray:
+    """Score every document and store the topic probabilities in its metadata.
+
+    Args:
+        model: The topic classifier
+        vectorstore: The vector store to update
+        page_size: Number of embeddings per page
+
+    Returns:
+        The number of documents whose most likely topic is each topic
+    """
+    counts = np.zeros(len(model.topics), dtype=np.int64)
+    for ids, embeddings, _ in vectorstore.iter_embeddings(page_size):
+        metadatas = model.metadatas(embeddings)
+        vectorstore.collection.update(ids=ids, metadatas=metadatas)
+        for metadata in metadatas:
+            counts[model.topics.index(str(metadata["topic"]))] += 1
+    return counts
+
+
+@profiled
+def main():
+    config = Config()
+    vectorstore = LegislationVectorStore(config=config)
+    labels = load_labels(
+        vectorstore, config.topics, config.out_dir / "labeled_embeddings.csv"
+    )
+    model = train(
+        vectorstore,
+        config.topics,
+        labels,
+        page_size=config.page_size,
+        epochs=config.classify_epochs,
+        seed=config.seed,
+    )
+    model.save(config.db_dir / "classifier")
+    counts = classify_all(model, vectorstore, page_size=config.page_size)
+    logger.info(
+        "Classified legislation",
+        extra={
+            "labeled": len(labels),
+            "topic-counts": dict(zip(config.topics, counts.tolist())),
+        },
+    )
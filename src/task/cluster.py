@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Topic clustering."""
+
+import json
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import HDBSCAN, MiniBatchKMeans
+
+from src.config import Config
+from src.logging import logger
+from src.profiling import profiled
+from src.task.similar import normalize
+from src.vectorstore import LegislationVectorStore
+
+
+class ClusterModel:
+    """Cluster centroids in embedding space.
+
+    Legislation is assigned to the cluster with the most similar centroid, so
+    newly ingested bills can be assigned without refitting.
+    """
+
+    def __init__(self, centroids: np.ndarray, method: str = "kmeans"):
+        self.centroids = normalize(np.asarray(centroids, dtype=np.float32))
+        self.method = method
+
+    def assign(self, embeddings: np.ndarray) -> np.ndarray:
+        """Assign embeddings to their nearest cluster.
+
+        Args:
+            embeddings: (n, d) embeddings
+
+        Returns:
+            The (n,) cluster id of each embedding
+        """
+        if len(embeddings) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.argmax(normalize(embeddings) @ self.centroids.T, axis=1)
+
+    def save(self, path: Path) -> None:
+        """Save the model to a directory."""
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "centroids.npy", self.centroids)
+        (path / "model.json").write_text(
+            json.dumps({"method": self.method, "n_clusters": len(self.centroids)})
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "ClusterModel":
+        """Load a model saved with `save`."""
+        meta = json.loads((path / "model.json").read_text())
+        return cls(np.load(path / "centroids.npy"), method=meta["method"])
+
+
+def fit_kmeans(
+    vectorstore: LegislationVectorStore,
+    n_clusters: int,
+    page_size: int = 1000,
+    epochs: int = 3,
+) -> ClusterModel:
+    """Fit MiniBatchKMeans by streaming pages of embeddings through `partial_fit`.
+
+    Args:
+        vectorstore: The vector store to read embeddings from
+        n_clusters: Number of clusters
+        page_size: Number of embeddings per page
+        epochs: Number of passes over the collection
+
+    Returns:
+        The fitted cluster model
+    """
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=0, n_init=3)
+    # Centroids are initialized from the first call to partial_fit, so hold
+    # back pages until there are enough samples to initialize from
+    init_size = 3 * n_clusters
+    pending: List[np.ndarray] = []
+    for _ in range(epochs):
+        for _, embeddings, _ in vectorstore.iter_embeddings(page_size):
+            if hasattr(kmeans, "cluster_centers_"):
+                kmeans.partial_fit(normalize(embeddings))
+                continue
+            pending.append(embeddings)
+            if sum(len(page) for page in pending) >= init_size:
+                kmeans.partial_fit(normalize(np.vstack(pending)))
+                pending = []
+        if pending and sum(len(page) for page in pending) >= n_clusters:
+            kmeans.partial_fit(normalize(np.vstack(pending)))
+            pending = []
+    if not hasattr(kmeans, "cluster_centers_"):
+        raise ValueError(f"Fewer than {n_clusters} embeddings to cluster")
+    return ClusterModel(kmeans.cluster_centers_, method="kmeans")
+
+
+def fit_hdbscan(
+    vectorstore: LegislationVectorStore,
+    reduced: pd.DataFrame,
+    min_cluster_size: int = 25,
+    page_size: int = 1000,
+) -> ClusterModel:
+    """Fit HDBSCAN on pre-reduced vectors and derive centroids in embedding space.
+
+    HDBSCAN runs on the low-dimensional output of `reduce`, then the
+    centroid of each cluster is accumulated page by page from the full
+    embeddings. Noise points do not contribute to any centroid.
+
+    Args:
+        vectorstore: The vector store to read embeddings from
+        reduced: Reduced embeddings with an `id` column and columns "0" and "1"
+        min_cluster_size: Minimum number of documents in a cluster
+        page_size: Number of embeddings per page
+
+    Returns:
+        The fitted cluster model
+    """
+    labels = HDBSCAN(min_cluster_size=min_cluster_size).fit_predict(
+        reduced[["0", "1"]].to_numpy()
+    )
+    label_of: Dict[str, int] = dict(zip(reduced["id"], labels))
+    n_clusters = int(labels.max()) + 1
+    if n_clusters == 0:
+        raise ValueError("HDBSCAN found no clusters")
+
+    sums = None
+    counts = np.zeros(n_clusters, dtype=np.int64)
+    for ids, embeddings, _ in vectorstore.iter_embeddings(page_size):
+        if sums is None:
+            sums = np.zeros((n_clusters, embeddings.shape[1]), dtype=np.float64)
+        page_labels = np.array([label_of.get(idx, -1) for idx in ids])
+        clustered = page_labels >= 0
+        np.add.at(sums, page_labels[clustered], normalize(embeddings[clustered]))
+        counts += np.bincount(page_labels[clustered], minlength=n_clusters)
+    return ClusterModel(sums / np.maximum(counts, 1)[:, None], method="hdbscan")
+
+
+def assign_all(
+    model: ClusterModel, vectorstore: LegislationVectorStore, page_size: int = 1000
+) -> np.ndarray:
+    """Assign every document to a cluster and store it in the `cluster` metadata.
+
+    Args:
+        model: The cluster model
+        vectorstore: The vector store to update
+        page_size: Number of embeddings per page
+
+    Returns:
+        The number of documents in each cluster
+    """
+    sizes = np.zeros(len(model.centroids), dtype=np.int64)
+    for ids, embeddings, _ in vectorstore.iter_embeddings(page_size):
+        labels = model.assign(embeddings)
+        vectorstore.collection.update(
+            ids=ids, metadatas=[{"cluster": int(label)} for label in labels]
+        )
+        sizes += np.bincount(labels, minlength=len(sizes))
+    return sizes
+
+
+@profiled
+def main():
+    config = Config()
+    vectorstore = LegislationVectorStore(config=config)
+    if config.cluster_method == "kmeans":
+        model = fit_kmeans(
+            vectorstore,
+            n_clusters=config.n_clusters,
+            page_size=config.page_size,
+            epochs=config.cluster_epochs,
+        )
+    elif config.cluster_method == "hdbscan":
+        model = fit_hdbscan(
+            vectorstore,
+            pd.read_csv(config.out_dir / "reduced_embeddings.csv"),
+            min_cluster_size=config.min_cluster_size,
+            page_size=config.page_size,
+        )
+    else:
+        raise ValueError(f"Unknown cluster method: {config.cluster_method}")
+    model.save(config.db_dir / "clusters")
+    sizes = assign_all(model, vectorstore, page_size=config.page_size)
+    logger.info(
+        "Clustered legislation",
+        extra={"method": model.method, "cluster-sizes": sizes.tolist()},
+    )
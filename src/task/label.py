@@ -5,6 +5,7 @@
 import pandas as pd
 
 from src.config import Config
+from src.profiling import profiled
 from src.task.reducer import Reducer
 from src.vectorstore import LegislationVectorStore
 
@@ -32,6 +33,7 @@ class Labeler:
         return df
 
 
+@profiled
 def main():
     config = Config()
     labeler = Labeler(config)
@@ -8,6 +8,7 @@ import plotly.express as px
 from sklearn.neighbors import NearestNeighbors
 
 from src.config import Config
+from src.profiling import profiled
 
 
 def find_most_isolated_points(df, n=5, k_neighbors=2):
@@ -27,6 +28,7 @@ def find_most_isolated_points(df, n=5, k_neighbors=2):
     return df.iloc[most_isolated_idx]
 
 
+@profiled
 def main():
     config = Config()
     df = pd.read_csv(config.out_dir / "labeled_embeddings.csv")
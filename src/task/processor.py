@@ -3,16 +3,30 @@
 """Data processing utilities."""
 import random
 import sqlite3
+import time
 from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import get_context
 from pathlib import Path
-from typing import Dict, Any, Optional, List, Callable, Tuple
+from typing import Dict, Any, Optional, List, Callable, Sequence, Tuple, Union
 
+import numpy as np
 import regex
 
+from src.autotune import Autotuner
 from src.config import Config
+from src.embedding import Embedder, EmbeddingPool, Encoder, HashingEncoder
+from src.journal import COMMITTED, EMBEDDED, STARTED, BatchJournal
 from src.logging import logger
+from src.metrics import MetricsExporter, metrics
+from src.profiling import profiled
+from src.resources import effective_cpu_count, memory_limit, memory_usage
+from src.shard import ShardedVectorStore, merge_shards
+from src.task.classify import TopicClassifier
+from src.task.cluster import ClusterModel
+from src.task.similar import update_graph
 from src.vectorstore import LegislationVectorStore
+from src.writer import VectorStoreWriter
 from src.xml import XMLParser
 
 # All identified bill versions with priority ordering
@@ -42,19 +56,87 @@ class BatchProcessor:
             List of results from processing each file
         """
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            return list(executor.map(process_fn, files))
+            futures = [executor.submit(process_fn, file) for file in files]
+            # Report the parse tasks that are queued or running as they finish
+            in_flight = len(futures)
+            metrics.set("parse_queue_depth", in_flight)
+            for _ in as_completed(futures):
+                in_flight -= 1
+                metrics.set("parse_queue_depth", in_flight)
+            return [future.result() for future in futures]
 
 
 class DataProcessor:
-    def __init__(self, config: Config = Config()):
+    def __init__(
+        self,
+        config: Config = Config(),
+        vectorstore: Optional[LegislationVectorStore] = None,
+        embedder: Optional[Embedder] = None,
+    ):
         self.data_dir = Path(config.data_dir)
         self.xml_parser = XMLParser()
         self.batch_processor = BatchProcessor(max_workers=config.max_workers)
-        self.vectorstore = LegislationVectorStore(config=config)
-        self.batch_size = config.batch_size
+        self.embedder: Embedder = embedder or EmbeddingPool(
+            workers=config.embed_workers,
+            threads=config.embed_threads,
+            token_budget=config.token_budget,
+        )
+        self.vectorstore = vectorstore or LegislationVectorStore(config=config)
+        self.journal = BatchJournal(self.vectorstore.db_dir / "journal")
+        self._run_id: Optional[int] = None
+        self.writer = VectorStoreWriter(
+            self.vectorstore,
+            batch_size=config.write_batch_size,
+            interval=config.write_interval,
+            on_flush=self._commit_batches,
+        )
+        cluster_dir = config.db_dir / "clusters"
+        self.cluster_model = (
+            ClusterModel.load(cluster_dir)
+            if (cluster_dir / "model.json").exists()
+            else None
+        )
+        classifier_dir = config.db_dir / "classifier"
+        self.classifier = (
+            TopicClassifier.load(classifier_dir)
+            if (classifier_dir / "model.json").exists()
+            else None
+        )
+        self.autotuner = self._autotuner(config) if config.autotune else None
+        # Autotuned runs plan small batches and process several at a time
+        self.batch_size = (
+            config.autotune_min_batch_size if config.autotune else config.batch_size
+        )
         self.limit = config.limit
         self.dedupe = config.dedupe
         self.prefix = config.prefix
+        self.seed = config.seed
+
+    @staticmethod
+    def _autotuner(config: Config) -> Autotuner:
+        """Create an autotuner for the effective CPU count and memory limit."""
+        cpus = effective_cpu_count()
+        limit = config.memory_limit or memory_limit()
+        autotuner = Autotuner(
+            workers=min(config.max_workers, cpus),
+            batch_size=config.batch_size,
+            memory_ceiling=int(limit * config.memory_fraction),
+            # Parse threads also wait on file reads, so try more of them than CPUs
+            max_workers=config.autotune_max_workers or 2 * cpus,
+            min_batch_size=config.autotune_min_batch_size,
+            max_batch_size=config.autotune_max_batch_size,
+        )
+        logger.info(
+            "Autotuning ingest",
+            extra={
+                "cpus": cpus,
+                "memory-limit": limit,
+                "memory-ceiling": autotuner.memory_ceiling,
+                "workers": autotuner.workers,
+                "batch-size": autotuner.batch_size,
+            },
+        )
+        return autotuner
 
     def process_file(self, file_path: Path) -> Optional[Dict[str, Any]]:
         """Process a single file with error handling.
@@ -65,22 +147,32 @@ class DataProcessor:
         Returns:
             Metadata associated with the file
         """
-        if self.vectorstore.is_processed(file_path):
+        with metrics.timer("state_check_ms"):
+            processed = self.vectorstore.is_processed(file_path)
+        if processed:
             logger.debug("Skipping processed file", extra={"file_path": file_path})
+            metrics.inc("files_skipped")
             return None
 
         try:
+            # Sign the file before reading it, so a change made while it is
+            # parsed or embedded leaves it looking unprocessed
+            signature = self.vectorstore.get_file_signature(file_path)
             # Parse XML metadata
-            result = self.xml_parser.parse_file(file_path)
+            with metrics.timer("parse_ms"):
+                result = self.xml_parser.parse_file(file_path)
+            metrics.observe("parse_bytes", file_path.stat().st_size)
             if result:
-                # Mark file as processed
-                self.vectorstore.mark_file_processed(file_path, result)
+                # The file is marked processed by the writer once it is stored
+                result["signature"] = signature
                 return result
+            metrics.inc("files_failed")
             return None
         except Exception as e:
             logger.error(
                 "Error processing file path", extra={"file_path": file_path}, exc_info=e
             )
+            metrics.inc("files_failed")
             return None
 
     # noinspection SqlResolve
@@ -105,65 +197,209 @@ class DataProcessor:
                 ),
             }
 
-    def process_batch(self, files: list[Path]) -> None:
-        """Process a batch of files and add to vector store.
+    def _commit_batches(self, batches: List[int]) -> None:
+        """Record batches whose records have all been written as committed."""
+        if self._run_id is not None:
+            self.journal.commit(self._run_id, batches)
+
+    def process_batch(self, files: list[Path], batch: Optional[int] = None) -> None:
+        """Process a batch of files and queue them for the vector store writer.
 
         Args:
             files: List of files to process
+            batch: Index of the batch in the journal of the current run
 
         Returns:
             None
         """
+        self.process_batches([(batch, files)])
+
+    def process_batches(self, batches: Sequence[Tuple[Optional[int], List[Path]]]) -> None:
+        """Process several batches of files at once and queue them for the vector store writer.
+
+        The files of all batches are parsed and embedded together, then
+        spooled and written per batch, so each batch is still committed on its own.
+
+        Args:
+            batches: Index in the journal of the current run and files of each batch
+
+        Returns:
+            None
+        """
+        files = [f for _, batch_files in batches for f in batch_files]
 
         # Process files in parallel
         results = self.batch_processor.process_files(files, self.process_file)
 
-        # Filter out None results and process valid ones
-        valid_results: List[Dict[str, Any]] = list(filter(None, results))
+        # Filter out None results and process valid ones, keeping track of their batch
+        batch_results: List[List[Dict[str, Any]]] = []
+        start = 0
+        for _, batch_files in batches:
+            batch_results.append(
+                list(filter(None, results[start : start + len(batch_files)]))
+            )
+            start += len(batch_files)
+        valid_results: List[Dict[str, Any]] = [r for rs in batch_results for r in rs]
 
         if not valid_results:
             logger.warning("No valid results in batch")
+            # Nothing to write, so the batches are already complete
+            self._commit_batches([batch for batch, _ in batches if batch is not None])
             return
 
-        self.vectorstore.collection.add(
-            documents=[_["text"] for _ in valid_results],
-            metadatas=[
-                {k: v for k, v in d.items() if k != "text"} for d in valid_results
-            ],
-            ids=[m["file_name"] for m in valid_results],
+        documents = [_["text"] for _ in valid_results]
+        with metrics.timer("embed_ms"):
+            embeddings = self.embedder.embed(documents)
+        metrics.set("embed_docs_per_second", self.embedder.stats.docs_per_second)
+        metrics.set("embed_padding_waste", self.embedder.stats.padding_waste)
+        if self.cluster_model is not None:
+            # Assign new legislation to an existing cluster without refitting
+            for result, cluster in zip(
+                valid_results, self.cluster_model.assign(np.asarray(embeddings))
+            ):
+                result["cluster"] = int(cluster)
+        if self.classifier is not None:
+            # Score new legislation with the trained topic classifier
+            for result, metadata in zip(
+                valid_results, self.classifier.metadatas(np.asarray(embeddings))
+            ):
+                result.update(metadata)
+        start = 0
+        for (batch, _), records in zip(batches, batch_results):
+            if not records:
+                if batch is not None:
+                    self._commit_batches([batch])
+                continue
+            batch_embeddings = embeddings[start : start + len(records)]
+            start += len(records)
+            if batch is not None and self._run_id is not None:
+                self.journal.spool(self._run_id, batch, records, batch_embeddings)
+            self.writer.put(records, batch_embeddings, batch=batch)
+
+    def _process_tuned(
+        self, autotuner: Autotuner, batches: List[Tuple[int, List[Path]]]
+    ) -> None:
+        """Process batches with the tuned worker count and report the outcome to the autotuner."""
+        self.batch_processor.max_workers = autotuner.workers
+        start = time.perf_counter()
+        self.process_batches(batches)
+        autotuner.observe(
+            sum(len(batch_files) for _, batch_files in batches),
+            time.perf_counter() - start,
+            memory_usage(),
         )
 
-    def process_all(self) -> None:
-        """Process all XML files in the bills directory.
+    def list_files(self) -> List[Path]:
+        """List the XML files to process, deduplicated and limited.
 
         Returns:
-            None
+            List of files to process
         """
-        files = list(self.data_dir.glob(f"{self.prefix}*.xml"))
+        files = sorted(self.data_dir.glob(f"{self.prefix}*.xml"))
         if self.dedupe:
-            files = self._dedupe_legislation(files)
+            files = sorted(self._dedupe_legislation(files))
         if self.limit:
-            # Randomly select a subset of files
-            random.shuffle(files)
+            # Randomly select a subset of files, in the same order on every run.
+            # The seeded sample only has to be reproducible, not unpredictable
+            random.Random(self.seed).shuffle(files)  # nosec B311
             files = files[:self.limit]
-        total_files = len(files)
+        return files
+
+    def process_all(self, files: Optional[List[Path]] = None) -> None:
+        """Process all XML files in the bills directory.
+
+        The batch plan of each run is recorded in the journal before any
+        batch is processed. If the previous run did not complete, it is
+        resumed instead: committed batches are skipped and embedded batches
+        are written from their spools without being parsed or embedded again.
+        A resumed run keeps its own batch plan, and a warning is logged if
+        the files or batch size requested now would plan differently.
+
+        When autotuning, consecutive batches are processed together until
+        they reach the tuned batch size.
+
+        Args:
+            files: Files to process, defaults to `list_files()`
+
+        Returns:
+            None
+        """
+        if files is None:
+            files = self.list_files()
+        plan = [
+            files[i : i + self.batch_size]
+            for i in range(0, len(files), self.batch_size)
+        ]
+        run_id = self.journal.open_run()
+        if run_id is None:
+            run_id = self.journal.start_run(plan, seed=self.seed)
+        else:
+            logger.info("Resuming interrupted run", extra={"run-id": run_id})
+            journaled = [batch_files for _, batch_files, _ in self.journal.batches(run_id)]
+            if journaled != plan:
+                # The interrupted run's files and batches win over the current settings
+                logger.warning(
+                    "Resumed run was planned with different files or batch size; "
+                    "the current files, --limit, --seed and --batch_size are ignored",
+                    extra={
+                        "run-id": run_id,
+                        "planned-files": sum(len(f) for f in journaled),
+                        "planned-batches": len(journaled),
+                        "requested-files": len(files),
+                        "requested-batches": len(plan),
+                    },
+                )
+        self._run_id = run_id
+        batches = self.journal.batches(run_id)
+        total_files = sum(len(batch_files) for _, batch_files, _ in batches)
         logger.info("Found XML files to process", extra={"total-files": total_files})
 
         # Process in batches
-        for i in range(0, total_files, self.batch_size):
-            batch = files[i : i + self.batch_size]
-            self.process_batch(batch)
-            logger.info(
-                "Processed batch",
-                extra={
-                    "batch-size": self.batch_size,
-                    "total-files": total_files,
-                    "batch-index": i,
-                },
-            )
-
-        # Persist the vector store
-        logger.info("Processing complete")
+        self.writer.start()
+        try:
+            done = 0
+            group: List[Tuple[int, List[Path]]] = []
+            for batch_index, batch_files, state in batches:
+                metrics.set("pending_files", total_files - done)
+                done += len(batch_files)
+                if state == COMMITTED:
+                    metrics.inc("batches_skipped")
+                    continue
+                if state == EMBEDDED:
+                    records, embeddings = self.journal.load_spool(run_id, batch_index)
+                    self.writer.put(records, embeddings, batch=batch_index)
+                    metrics.inc("batches_resumed")
+                    continue
+                self.journal.mark(run_id, [batch_index], STARTED)
+                if self.autotuner is None:
+                    self.process_batch(batch_files, batch=batch_index)
+                    batch_size = self.batch_size
+                else:
+                    group.append((batch_index, batch_files))
+                    batch_size = sum(len(f) for _, f in group)
+                    if batch_size < self.autotuner.batch_size:
+                        continue
+                    self._process_tuned(self.autotuner, group)
+                    group = []
+                logger.info(
+                    "Processed batch",
+                    extra={
+                        "batch-size": batch_size,
+                        "total-files": total_files,
+                        "batch-index": batch_index,
+                        "files-processed": metrics.counter("files_processed"),
+                        "files-skipped": metrics.counter("files_skipped"),
+                    },
+                )
+            if group and self.autotuner is not None:
+                self._process_tuned(self.autotuner, group)
+        finally:
+            self.embedder.close()
+            self.writer.close()
+            metrics.set("pending_files", 0)
+
+        if self.journal.finish_run(run_id):
+            logger.info("Processing complete")
 
     @staticmethod
     def _extract_filename_components(filename: Path) -> Optional[Tuple[int, str, int, str]]:
@@ -214,10 +450,114 @@ class DataProcessor:
         for congress, legislation_types in d.items():
             for legislation_type, legislation_numbers in legislation_types.items():
                 for legislation_number, status in legislation_numbers.items():
-                    files_subset.append(Path("data") / f"BILLS-{congress}{legislation_type}{legislation_number}{status}.xml")
+                    files_subset.append(self.data_dir / f"BILLS-{congress}{legislation_type}{legislation_number}{status}.xml")
         return files_subset
 
 
+def metrics_exporter(config: Config, name: str = "metrics") -> MetricsExporter:
+    """Create an exporter of the metrics to `out_dir` in the configured format.
+
+    Args:
+        config: Configuration
+        name: File name of the export, without the suffix
+
+    Returns:
+        The exporter
+    """
+    suffix = "prom" if config.metrics_format == "prometheus" else "json"
+    return MetricsExporter(
+        metrics,
+        path=config.out_dir / f"{name}.{suffix}",
+        fmt=config.metrics_format,
+        interval=config.metrics_interval,
+    )
+
+
+def _process_shard(
+    config: Config,
+    name: str,
+    files: List[Path],
+    encoder: Callable[..., Union[Encoder, HashingEncoder]] = Encoder,
+) -> int:
+    """Ingest the files of one shard into the shard's store.
+
+    Runs in a shard worker process, which may be reused for several shards,
+    so the metrics are reset for each shard. They are exported to the
+    shard's own `metrics-shard-<name>` file, since the metrics of the parent
+    process never see them.
+
+    Args:
+        config: Configuration of the shard's store
+        name: Name of the shard
+        files: Files belonging to the shard
+        encoder: Encoder class of the embedding workers
+
+    Returns:
+        The number of files processed
+    """
+    metrics.reset()
+    config.db_dir.mkdir(parents=True, exist_ok=True)
+    embedder = EmbeddingPool(
+        workers=config.embed_workers,
+        threads=config.embed_threads,
+        token_budget=config.token_budget,
+        encoder=encoder,
+    )
+    with metrics_exporter(config, f"metrics-shard-{name}"):
+        DataProcessor(config=config, embedder=embedder).process_all(files)
+    return int(metrics.counter("files_processed"))
+
+
+def process_sharded(
+    config: Config,
+    files: List[Path],
+    encoder: Callable[..., Union[Encoder, HashingEncoder]] = Encoder,
+) -> Dict[str, int]:
+    """Ingest files into their shards, with one worker process per shard.
+
+    Up to `shard_workers` shards are ingested at once, each by its own
+    `DataProcessor` writing to the shard's store, and the embedding workers
+    are divided between them. Worker processes are spawned rather than
+    forked, so they do not inherit the threads and SQLite connections of
+    this process.
+
+    Args:
+        config: Configuration
+        files: Files to process
+        encoder: Encoder class of the embedding workers
+
+    Returns:
+        The number of files processed in each shard
+    """
+    store = ShardedVectorStore(config=config)
+    embed_workers = max(1, config.embed_workers // config.shard_workers)
+    processed: Dict[str, int] = {}
+    with ProcessPoolExecutor(
+        max_workers=config.shard_workers, mp_context=get_context("spawn")
+    ) as executor:
+        futures = {
+            executor.submit(
+                _process_shard,
+                store.shard_config(name).model_copy(
+                    update={"embed_workers": embed_workers}
+                ),
+                name,
+                shard_files,
+                encoder,
+            ): name
+            for name, shard_files in sorted(store.partition(files).items())
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            processed[name] = future.result()
+            logger.info(
+                "Processed shard",
+                extra={"shard": name, "files-processed": processed[name]},
+            )
+    return processed
+
+
+@profiled
 def main():
     config = Config()
     processor = DataProcessor(config=config)
@@ -227,9 +567,19 @@ def main():
     logger.info("Initial status", extra={"status": status})
 
     try:
-        processor.process_all()
+        if config.shard_by:
+            # Each shard process exports its own metrics-shard-<name> file
+            process_sharded(config, processor.list_files())
+            return
+        with metrics_exporter(config):
+            processor.process_all()
+        # Keep a previously built similarity graph up to date
+        if (config.db_dir / "similar" / "ids.json").exists():
+            update_graph(config, processor.vectorstore)
     except KeyboardInterrupt:
-        logger.info("Processing interrupted. Progress has been saved.")
+        logger.info(
+            "Processing interrupted. Progress has been saved; rerun to resume."
+        )
         status = processor.get_processing_status()
         logger.info("Final status", extra={"status": status})
     except Exception as e:
@@ -237,5 +587,15 @@ def main():
         raise
 
 
+@profiled
+def merge_main():
+    config = Config()
+    store = ShardedVectorStore(config=config)
+    merged = merge_shards(
+        store, LegislationVectorStore(config=config), page_size=config.page_size
+    )
+    logger.info("Merged shards", extra={"shards": store.names, "records": merged})
+
+
 if __name__ == "__main__":
     main()
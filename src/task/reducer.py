@@ -10,6 +10,7 @@ import umap
 from chromadb.api.types import IncludeEnum, Embeddings, PyEmbeddings, NDArray, Metadata
 
 from src.config import Config
+from src.profiling import profiled
 from src.vectorstore import LegislationVectorStore
 
 
@@ -18,10 +19,14 @@ class Reducer:
 
     def __init__(
         self,
-        vectorstore: LegislationVectorStore = LegislationVectorStore(config=Config()),
+        vectorstore: Optional[LegislationVectorStore] = None,
         reducer=umap.UMAP(n_neighbors=10, n_components=2, min_dist=0.0),
     ):
-        self.vectorstore: LegislationVectorStore = vectorstore
+        self.vectorstore: LegislationVectorStore = (
+            vectorstore
+            if vectorstore is not None
+            else LegislationVectorStore(config=Config())
+        )
         self.reducer = reducer
         self.ids: List[str] = []
         self.metadatas: Optional[List[Metadata]] = []
@@ -57,6 +62,7 @@ class Reducer:
         return df
 
 
+@profiled
 def main():
     config = Config()
     vectorstore = LegislationVectorStore(config=config)
@@ -2,31 +2,43 @@
 # -*- coding: utf-8 -*-
 """Search"""
 
-from typing import Any, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Mapping, Optional
 
-from chromadb import QueryResult
+from chromadb import QueryResult, Where
+from chromadb.api.types import IncludeEnum
+from chromadb.types import InclusionExclusionOperator, LiteralValue
 
 from src.config import Config
+from src.profiling import profiled
+from src.shard import AnyVectorStore, ShardedVectorStore
 from src.vectorstore import LegislationVectorStore
 
+# Rank constant of reciprocal-rank fusion, as in Cormack et al. (2009)
+RRF_K = 60
+
 
 def search(
     query: str = "",
-    vectorstore: LegislationVectorStore = LegislationVectorStore(),
+    vectorstore: Optional[AnyVectorStore] = None,
     limit: int = 5,
+    where: Optional[Where] = None,
 ) -> list[Any] | list[Mapping[str, str | int | float | bool]]:
     """Search the vector store for similar legislation.
 
     Args:
         query: The query string to search for
-        vectorstore: The vector store to search
+        vectorstore: The vector store to search, defaults to the configured store
         limit: The maximum number of results to return
+        where: Optional metadata filter
 
     Returns:
         A list of similar legislation
     """
+    if vectorstore is None:
+        vectorstore = LegislationVectorStore()
     results: QueryResult = vectorstore.collection.query(
-        query_texts=[query], n_results=limit
+        query_texts=[query], n_results=limit, where=where
     )
     metadatas = results.get("metadatas", [])
     if not metadatas:
@@ -34,7 +46,143 @@ def search(
     return [_ for r in metadatas for _ in r]
 
 
+def excerpt(text: str, length: int = 200) -> str:
+    """Return the start of a document's text on a single line."""
+    text = " ".join(text.split())
+    return text if len(text) <= length else f"{text[:length]}..."
+
+
+def get_metadatas(
+    vectorstore: AnyVectorStore, ids: List[str]
+) -> List[Mapping[str, Any]]:
+    """Fetch the metadata of documents, in the order of `ids`."""
+    if not ids:
+        return []
+    result = vectorstore.collection.get(ids=ids, include=[IncludeEnum.metadatas])
+    by_id = dict(zip(result["ids"], result["metadatas"] or []))
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def lexical_search(
+    query: str = "",
+    vectorstore: Optional[AnyVectorStore] = None,
+    limit: int = 5,
+) -> List[Mapping[str, Any]]:
+    """Search the full-text index with BM25 ranking.
+
+    Args:
+        query: The query string to search for
+        vectorstore: The vector store whose full-text index is searched, defaults
+            to the configured store
+        limit: The maximum number of results to return
+
+    Returns:
+        A list of matching legislation
+    """
+    if vectorstore is None:
+        vectorstore = LegislationVectorStore()
+    hits = vectorstore.lexical_index.search(query, limit=limit)
+    return get_metadatas(vectorstore, [file_name for file_name, _ in hits])
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[str]:
+    """Merge ranked lists of ids with reciprocal-rank fusion.
+
+    Args:
+        rankings: Ranked lists of ids, best first
+        k: Rank constant that damps the weight of the top ranks
+
+    Returns:
+        The ids of all lists ordered by fused score
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, idx in enumerate(ranking, start=1):
+            scores[idx] = scores.get(idx, 0.0) + 1 / (k + rank)
+    return sorted(scores, key=lambda idx: scores[idx], reverse=True)
+
+
+def hybrid_search(
+    query: str = "",
+    vectorstore: Optional[AnyVectorStore] = None,
+    limit: int = 5,
+    candidates: int = 50,
+) -> List[Mapping[str, Any]]:
+    """Run BM25 and vector retrieval concurrently and fuse the rankings.
+
+    Args:
+        query: The query string to search for
+        vectorstore: The vector store to search, defaults to the configured store
+        limit: The maximum number of results to return
+        candidates: Number of results retrieved by each method before fusion
+
+    Returns:
+        A list of matching legislation
+    """
+    if vectorstore is None:
+        vectorstore = LegislationVectorStore()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        lexical = executor.submit(vectorstore.lexical_index.search, query, candidates)
+        vector = executor.submit(search, query, vectorstore, candidates)
+        rankings: List[List[str]] = [
+            [file_name for file_name, _ in lexical.result()],
+            [str(m["file_name"]) for m in vector.result()],
+        ]
+    return get_metadatas(vectorstore, reciprocal_rank_fusion(rankings)[:limit])
+
+
+def prefilter_search(
+    query: str = "",
+    vectorstore: Optional[AnyVectorStore] = None,
+    limit: int = 5,
+    candidates: int = 200,
+) -> List[Mapping[str, Any]]:
+    """Rank the full-text matches of a query by vector similarity.
+
+    The full-text index acts as a cheap candidate filter; if nothing matches
+    lexically this falls back to a plain vector search.
+
+    Args:
+        query: The query string to search for
+        vectorstore: The vector store to search, defaults to the configured store
+        limit: The maximum number of results to return
+        candidates: Number of full-text matches passed to the vector query
+
+    Returns:
+        A list of matching legislation
+    """
+    if vectorstore is None:
+        vectorstore = LegislationVectorStore()
+    hits = vectorstore.lexical_index.search(query, limit=candidates)
+    if not hits:
+        return search(query, vectorstore, limit)
+    file_names: Dict[InclusionExclusionOperator, List[LiteralValue]] = {
+        "$in": [file_name for file_name, _ in hits]
+    }
+    where: Where = {"file_name": file_names}
+    return search(query, vectorstore, min(limit, len(hits)), where=where)
+
+
+@profiled
 def main():
     config = Config()
-    for result in search(query=config.query):
+    search_fns = {
+        "vector": search,
+        "lexical": lexical_search,
+        "hybrid": hybrid_search,
+        "prefilter": prefilter_search,
+    }
+    if config.search_mode not in search_fns:
+        raise ValueError(f"Unknown search mode: {config.search_mode}")
+    vectorstore = (
+        ShardedVectorStore(config=config)
+        if config.shard_by
+        else LegislationVectorStore(config=config)
+    )
+    search_fn = search_fns[config.search_mode]
+    results = search_fn(query=config.query, vectorstore=vectorstore)
+    texts = vectorstore.get_texts(results) if config.show_text else []
+    for i, result in enumerate(results):
         print(result["dc_title"])
+        if config.show_text:
+            print(f"    {excerpt(texts[i])}")
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Similar legislation graph."""
+
+import json
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from chromadb.api.types import IncludeEnum
+
+from src.config import Config
+from src.logging import logger
+from src.profiling import profiled
+from src.task.search import excerpt, get_metadatas
+from src.vectorstore import LegislationVectorStore
+
+
+def merge_topk(
+    scores: np.ndarray,
+    indices: np.ndarray,
+    candidate_scores: np.ndarray,
+    candidate_indices: np.ndarray,
+    k: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge candidate neighbors into the current top-k of each row.
+
+    Args:
+        scores: (n, k) current similarity scores
+        indices: (n, k) current neighbor rows
+        candidate_scores: (n, c) candidate similarity scores
+        candidate_indices: (n, c) candidate neighbor rows
+        k: Number of neighbors to keep
+
+    Returns:
+        The merged (n, k) scores and indices, best first
+    """
+    all_scores = np.concatenate([scores, candidate_scores], axis=1)
+    all_indices = np.concatenate([indices, candidate_indices], axis=1)
+    if all_scores.shape[1] > k:
+        top = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+        all_scores = np.take_along_axis(all_scores, top, axis=1)
+        all_indices = np.take_along_axis(all_indices, top, axis=1)
+    order = np.argsort(-all_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(all_scores, order, axis=1),
+        np.take_along_axis(all_indices, order, axis=1),
+    )
+
+
+def blocked_topk(
+    queries: np.ndarray,
+    query_rows: np.ndarray,
+    corpus: np.ndarray,
+    corpus_rows: np.ndarray,
+    k: int,
+    block_size: int = 1024,
+    executor: Optional[ThreadPoolExecutor] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Find the k most similar corpus rows of each query with blocked matrix products.
+
+    Queries are split into row blocks that are processed in parallel, and each
+    block is multiplied against the corpus one column block at a time, so
+    memory stays bounded by `block_size ** 2` scores per thread. A query is
+    never its own neighbor.
+
+    Args:
+        queries: (n, d) normalized query embeddings
+        query_rows: (n,) graph row of each query
+        corpus: (m, d) normalized corpus embeddings
+        corpus_rows: (m,) graph row of each corpus embedding
+        k: Number of neighbors
+        block_size: Number of rows and columns per block
+        executor: Thread pool used to process row blocks in parallel
+
+    Returns:
+        The (n, k) cosine similarities and neighbor rows, best first; missing
+        neighbors have a score of -inf and a row of -1
+    """
+
+    def run(start: int) -> Tuple[np.ndarray, np.ndarray]:
+        block = queries[start : start + block_size]
+        block_rows = query_rows[start : start + block_size]
+        scores = np.full((len(block), k), -np.inf, dtype=np.float32)
+        indices = np.full((len(block), k), -1, dtype=np.int64)
+        for col in range(0, len(corpus), block_size):
+            rows = corpus_rows[col : col + block_size]
+            sims = block @ corpus[col : col + block_size].T
+            sims[block_rows[:, None] == rows[None, :]] = -np.inf
+            scores, indices = merge_topk(
+                scores, indices, sims, np.broadcast_to(rows, sims.shape), k
+            )
+        return scores, indices
+
+    starts = range(0, len(queries), block_size)
+    results = list(executor.map(run, starts)) if executor else [run(s) for s in starts]
+    if not results:
+        return (
+            np.empty((0, k), dtype=np.float32),
+            np.empty((0, k), dtype=np.int64),
+        )
+    return (
+        np.concatenate([r[0] for r in results]),
+        np.concatenate([r[1] for r in results]),
+    )
+
+
+def normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.clip(norms, 1e-12, None)
+
+
+class SimilarityGraph:
+    """Top-k similar-legislation graph.
+
+    Neighbors are stored as fixed-width (n, k) arrays of row numbers and
+    cosine similarities, so a lookup is a single row read. Saved graphs are
+    memory-mapped when loaded.
+    """
+
+    def __init__(
+        self,
+        ids: List[str],
+        indices: np.ndarray,
+        scores: np.ndarray,
+        k: int,
+        checksums: Optional[np.ndarray] = None,
+    ):
+        self.ids = ids
+        self.indices = indices
+        self.scores = scores
+        self.k = k
+        # Checksums of the embeddings each row was computed from
+        self.checksums = checksums
+        self._rows: Dict[str, int] = {idx: row for row, idx in enumerate(ids)}
+
+    @classmethod
+    def empty(cls, k: int = 10) -> "SimilarityGraph":
+        return cls(
+            [],
+            np.empty((0, k), dtype=np.int32),
+            np.empty((0, k), dtype=np.float32),
+            k,
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, idx: str) -> bool:
+        return idx in self._rows
+
+    def neighbors(self, idx: str, n: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Look up the most similar legislation.
+
+        Args:
+            idx: Legislation id
+            n: Maximum number of neighbors, defaults to k
+
+        Returns:
+            Pairs of neighbor id and cosine similarity, most similar first
+        """
+        row = self._rows[idx]
+        return [
+            (self.ids[neighbor], float(score))
+            for neighbor, score in zip(self.indices[row][:n], self.scores[row][:n])
+            if neighbor >= 0
+        ]
+
+    def update(
+        self,
+        vectorstore: LegislationVectorStore,
+        page_size: int = 1000,
+        block_size: int = 1024,
+        workers: int = 1,
+    ) -> int:
+        """Bring the graph up to date with the collection.
+
+        Added documents, documents whose embedding changed (found by a
+        checksum of the stored embedding) and documents that had a changed or
+        deleted neighbor are compared against every page of the collection.
+        Deleted documents are dropped, and every other row is compared against
+        the added and changed embeddings only, so the cost of an update grows
+        with the number of changes rather than the corpus squared. Building a
+        graph from scratch is an update of an empty graph.
+
+        Args:
+            vectorstore: The vector store to read embeddings from
+            page_size: Number of embeddings read per page
+            block_size: Number of rows and columns per matrix product block
+            workers: Number of threads computing matrix product blocks
+
+        Returns:
+            The number of rows added, recomputed or removed
+        """
+        checksums: Dict[str, int] = {}
+        for page_ids, page_embeddings, _ in vectorstore.iter_embeddings(page_size):
+            for idx, embedding in zip(page_ids, page_embeddings):
+                checksums[idx] = zlib.crc32(embedding.tobytes())
+        previous = (
+            dict(zip(self.ids, self.checksums.tolist()))
+            if self.checksums is not None
+            else {}
+        )
+        deleted = {idx for idx in self.ids if idx not in checksums}
+        changed = {
+            idx
+            for idx in self.ids
+            if idx in checksums and previous.get(idx) != checksums[idx]
+        }
+        added = [idx for idx in checksums if idx not in self._rows]
+        if not deleted and not changed and not added:
+            return 0
+
+        # Rows that listed a deleted or changed neighbor have to be recomputed
+        old_indices = np.asarray(self.indices, dtype=np.int64)
+        stale_rows = [self._rows[idx] for idx in deleted | changed]
+        affected = np.isin(old_indices, stale_rows).any(axis=1)
+        dirty_ids = (
+            changed | {self.ids[row] for row in np.flatnonzero(affected)}
+        ) - deleted
+
+        # Drop the deleted rows and append the added ones
+        ids = [idx for idx in self.ids if idx not in deleted] + added
+        rows = {idx: row for row, idx in enumerate(ids)}
+        remap = np.array([rows.get(idx, -1) for idx in self.ids], dtype=np.int64)
+        kept = remap >= 0
+        scores = np.full((len(ids), self.k), -np.inf, dtype=np.float32)
+        indices = np.full((len(ids), self.k), -1, dtype=np.int64)
+        scores[remap[kept]] = np.asarray(self.scores, dtype=np.float32)[kept]
+        indices[remap[kept]] = np.where(
+            old_indices[kept] >= 0, remap[np.maximum(old_indices[kept], 0)], -1
+        )
+
+        dirty_rows = np.array(
+            sorted(rows[idx] for idx in dirty_ids | set(added)), dtype=np.int64
+        )
+        scores[dirty_rows] = -np.inf
+        indices[dirty_rows] = -1
+        is_dirty = np.zeros(len(ids), dtype=bool)
+        is_dirty[dirty_rows] = True
+        dirty_vectors = self._fetch(vectorstore, [ids[row] for row in dirty_rows])
+        # Embeddings that no clean row has been compared against yet
+        fresh = np.isin(dirty_rows, [rows[idx] for idx in changed | set(added)])
+        fresh_rows, fresh_vectors = dirty_rows[fresh], dirty_vectors[fresh]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for page_ids, page_embeddings, _ in vectorstore.iter_embeddings(page_size):
+                # Skip documents added since the first pass
+                known = np.array([idx in rows for idx in page_ids], dtype=bool)
+                if not known.any():
+                    continue
+                page_vectors = normalize(page_embeddings[known])
+                page_rows = np.array(
+                    [rows[idx] for idx in page_ids if idx in rows], dtype=np.int64
+                )
+
+                # Added, changed and affected rows against this page of the corpus
+                if len(dirty_rows):
+                    page_scores, page_indices = blocked_topk(
+                        dirty_vectors,
+                        dirty_rows,
+                        page_vectors,
+                        page_rows,
+                        self.k,
+                        block_size,
+                        executor,
+                    )
+                    scores[dirty_rows], indices[dirty_rows] = merge_topk(
+                        scores[dirty_rows],
+                        indices[dirty_rows],
+                        page_scores,
+                        page_indices,
+                        self.k,
+                    )
+
+                # Other rows on this page against the added and changed rows
+                clean = ~is_dirty[page_rows]
+                if clean.any() and len(fresh_rows):
+                    clean_scores, clean_indices = blocked_topk(
+                        page_vectors[clean],
+                        page_rows[clean],
+                        fresh_vectors,
+                        fresh_rows,
+                        self.k,
+                        block_size,
+                        executor,
+                    )
+                    clean_rows = page_rows[clean]
+                    scores[clean_rows], indices[clean_rows] = merge_topk(
+                        scores[clean_rows],
+                        indices[clean_rows],
+                        clean_scores,
+                        clean_indices,
+                        self.k,
+                    )
+
+        self.ids = ids
+        self._rows = rows
+        self.scores = scores
+        self.indices = indices.astype(np.int32)
+        self.checksums = np.array([checksums[idx] for idx in ids], dtype=np.uint32)
+        return len(dirty_rows) + len(deleted)
+
+    @staticmethod
+    def _fetch(
+        vectorstore: LegislationVectorStore, ids: List[str], page_size: int = 1000
+    ) -> np.ndarray:
+        """Fetch the normalized embeddings of documents, in the order of `ids`."""
+        embeddings: List[np.ndarray] = []
+        for start in range(0, len(ids), page_size):
+            page = ids[start : start + page_size]
+            result = vectorstore.collection.get(
+                ids=page, include=[IncludeEnum.embeddings]
+            )
+            by_id = dict(zip(result["ids"], np.asarray(result["embeddings"])))
+            embeddings.extend(by_id[idx] for idx in page)
+        if not embeddings:
+            return np.empty((0, 0), dtype=np.float32)
+        return normalize(np.asarray(embeddings, dtype=np.float32))
+
+    def save(self, path: Path) -> None:
+        """Save the graph to a directory."""
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "indices.npy", np.asarray(self.indices, dtype=np.int32))
+        np.save(path / "scores.npy", np.asarray(self.scores, dtype=np.float32))
+        if self.checksums is not None:
+            np.save(path / "checksums.npy", self.checksums)
+        (path / "ids.json").write_text(json.dumps({"k": self.k, "ids": self.ids}))
+
+    @classmethod
+    def load(cls, path: Path) -> "SimilarityGraph":
+        """Load a graph saved with `save`, memory-mapping the neighbor arrays.
+
+        Graphs saved without checksums have every row recomputed by the next
+        `update`.
+        """
+        meta = json.loads((path / "ids.json").read_text())
+        checksums = path / "checksums.npy"
+        return cls(
+            meta["ids"],
+            np.load(path / "indices.npy", mmap_mode="r"),
+            np.load(path / "scores.npy", mmap_mode="r"),
+            meta["k"],
+            np.load(checksums) if checksums.exists() else None,
+        )
+
+
+def update_graph(
+    config: Config, vectorstore: LegislationVectorStore, rebuild: bool = False
+) -> SimilarityGraph:
+    """Build or incrementally update the saved similarity graph.
+
+    Args:
+        config: Configuration
+        vectorstore: The vector store to read embeddings from
+        rebuild: Whether to build the graph from scratch rather than update
+            the saved one
+
+    Returns:
+        The updated graph
+    """
+    path = config.db_dir / "similar"
+    graph = (
+        SimilarityGraph.load(path)
+        if (path / "ids.json").exists() and not rebuild
+        else SimilarityGraph.empty(config.similar_k)
+    )
+    updated = graph.update(
+        vectorstore, page_size=config.page_size, workers=config.max_workers
+    )
+    if updated:
+        graph.save(path)
+    logger.info(
+        "Updated similarity graph", extra={"updated": updated, "total": len(graph)}
+    )
+    return graph
+
+
+@profiled
+def main():
+    config = Config()
+    vectorstore = LegislationVectorStore(config=config)
+    path = config.db_dir / "similar"
+    # `process` keeps a saved graph up to date, so lookups read it as it is
+    if config.rebuild or not (path / "ids.json").exists():
+        graph = update_graph(config, vectorstore, rebuild=config.rebuild)
+    else:
+        graph = SimilarityGraph.load(path)
+    if config.bill_id:
+        if config.bill_id not in graph:
+            logger.error("Unknown legislation id", extra={"bill-id": config.bill_id})
+            sys.exit(1)
+        neighbors = graph.neighbors(config.bill_id)
+        metadatas = {
+            m["file_name"]: m
+            for m in get_metadatas(vectorstore, [idx for idx, _ in neighbors])
+        }
+        texts = (
+            dict(zip(metadatas, vectorstore.get_texts(list(metadatas.values()))))
+            if config.show_text
+            else {}
+        )
+        for idx, score in neighbors:
+            title = metadatas[idx]["dc_title"] if idx in metadatas else idx
+            print(f"{score:.3f} {title}")
+            if idx in texts:
+                print(f"    {excerpt(texts[idx])}")
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Snapshot export and import."""
+
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.config import Config
+from src.logging import logger
+from src.profiling import profiled
+from src.vectorstore import LegislationVectorStore
+
+SNAPSHOT_FORMAT = "congress-embeddings-snapshot"
+SNAPSHOT_VERSION = 1
+
+RECORD_SCHEMA = pa.schema(
+    [("id", pa.string()), ("document", pa.string()), ("metadata", pa.string())]
+)
+PROCESSED_FILES_SCHEMA = pa.schema(
+    [
+        ("file_path", pa.string()),
+        ("file_signature", pa.string()),
+        ("processed_at", pa.string()),
+        ("metadata", pa.string()),
+    ]
+)
+
+
+def file_checksum(path: Path) -> str:
+    """Return the SHA-256 hash of a file, read in 1 MiB chunks."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_checksums(path: Path, checksums: Dict[str, str]) -> None:
+    """Check snapshot files against the checksums in the manifest.
+
+    Args:
+        path: Snapshot directory
+        checksums: Mapping of file name to SHA-256 hash
+
+    Returns:
+        None
+    """
+    for name, expected in checksums.items():
+        if file_checksum(path / name) != expected:
+            raise ValueError(f"Checksum mismatch in snapshot file: {path / name}")
+
+
+def read_manifest(path: Path) -> Dict[str, Any]:
+    """Read the manifest of a snapshot and check that its version is supported.
+
+    Args:
+        path: Snapshot directory
+
+    Returns:
+        The manifest
+    """
+    manifest_path = path / "manifest.json"
+    if not manifest_path.exists():
+        raise ValueError(f"Not a complete snapshot: {path}")
+    manifest = json.loads(manifest_path.read_text())
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Not a snapshot: {path}")
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {manifest.get('version')}")
+    return manifest
+
+
+def export_snapshot(
+    vectorstore: LegislationVectorStore, path: Path, page_size: int = 1000
+) -> Dict[str, Any]:
+    """Export the vector store to a snapshot directory, one page at a time.
+
+    Each page is written as a float32 `.npy` array of embeddings and a
+    zstd-compressed Parquet file of ids, document text and JSON metadata.
+    Records are read with `iter_records`, so a snapshot can be imported
+    with or without `--compact`. The manifest is
+    written last, so an interrupted export is never mistaken for a snapshot.
+
+    Args:
+        vectorstore: The vector store to export
+        path: Snapshot directory
+        page_size: Number of records per page
+
+    Returns:
+        The manifest
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    parts: List[Dict[str, Any]] = []
+    dimension: Optional[int] = None
+    count = 0
+    for ids, embeddings, metadatas, texts in vectorstore.iter_records(page_size):
+        dimension = embeddings.shape[1]
+        name = f"part-{len(parts):05d}"
+        np.save(path / f"{name}.npy", embeddings)
+        table = pa.table(
+            {
+                "id": ids,
+                "document": texts,
+                "metadata": [json.dumps(m) for m in metadatas],
+            },
+            schema=RECORD_SCHEMA,
+        )
+        pq.write_table(table, path / f"{name}.parquet", compression="zstd")
+        files = [f"{name}.npy", f"{name}.parquet"]
+        parts.append(
+            {
+                "count": len(ids),
+                "embeddings": files[0],
+                "records": files[1],
+                "checksums": {f: file_checksum(path / f) for f in files},
+            }
+        )
+        count += len(ids)
+        logger.info("Exported snapshot part", extra={"part": name, "records": count})
+
+    processed_files = "processed_files.parquet"
+    processed_count = 0
+    with pq.ParquetWriter(
+        path / processed_files, PROCESSED_FILES_SCHEMA, compression="zstd"
+    ) as writer:
+        for rows in vectorstore.iter_processed_files(page_size):
+            writer.write_table(
+                pa.Table.from_pylist(
+                    [dict(zip(PROCESSED_FILES_SCHEMA.names, row)) for row in rows],
+                    schema=PROCESSED_FILES_SCHEMA,
+                )
+            )
+            processed_count += len(rows)
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "count": count,
+        "dimension": dimension,
+        "parts": parts,
+        "processed_files": {
+            "count": processed_count,
+            "file": processed_files,
+            "checksums": {processed_files: file_checksum(path / processed_files)},
+        },
+    }
+    tmp_path = path / "manifest.json.tmp"
+    tmp_path.write_text(json.dumps(manifest, indent=2))
+    tmp_path.replace(path / "manifest.json")
+    return manifest
+
+
+def import_snapshot(
+    vectorstore: LegislationVectorStore, path: Path, batch_size: int = 1000
+) -> int:
+    """Bulk-load a snapshot into an empty vector store.
+
+    Every file is verified against its checksum before it is loaded, and the
+    number of loaded records is checked against the manifest. The stored
+    embeddings are loaded as-is, so nothing is re-embedded, and the lexical
+    index is rebuilt from the document text.
+
+    Args:
+        vectorstore: The empty vector store to load into
+        path: Snapshot directory
+        batch_size: Number of records per upsert
+
+    Returns:
+        The number of records loaded
+    """
+    manifest = read_manifest(path)
+    if vectorstore.collection.count():
+        raise ValueError("Snapshots can only be imported into an empty vector store")
+
+    for part in manifest["parts"]:
+        verify_checksums(path, part["checksums"])
+        embeddings = np.load(path / part["embeddings"], mmap_mode="r")
+        table = pq.read_table(path / part["records"])
+        if len(embeddings) != part["count"] or table.num_rows != part["count"]:
+            raise ValueError(f"Record count mismatch in snapshot: {part['records']}")
+        ids = table.column("id").to_pylist()
+        documents = table.column("document").to_pylist()
+        metadatas = [json.loads(m) for m in table.column("metadata").to_pylist()]
+
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            vectorstore.add_records(
+                ids[start:end],
+                embeddings[start:end],
+                metadatas[start:end],
+                [text or "" for text in documents[start:end]],
+            )
+        logger.info("Imported snapshot part", extra={"part": part["records"]})
+
+    processed_files = manifest["processed_files"]
+    verify_checksums(path, processed_files["checksums"])
+    for batch in pq.ParquetFile(path / processed_files["file"]).iter_batches(
+        batch_size
+    ):
+        vectorstore.restore_processed_files(
+            [tuple(row.values()) for row in batch.to_pylist()]
+        )
+
+    count = vectorstore.collection.count()
+    if count != manifest["count"]:
+        raise ValueError(
+            f"Imported {count} records but the snapshot has {manifest['count']}"
+        )
+    return count
+
+
+@profiled
+def export_main():
+    config = Config()
+    vectorstore = LegislationVectorStore(config=config)
+    manifest = export_snapshot(
+        vectorstore, config.snapshot_dir, page_size=config.page_size
+    )
+    logger.info(
+        "Exported snapshot",
+        extra={"path": str(config.snapshot_dir), "records": manifest["count"]},
+    )
+
+
+@profiled
+def import_main():
+    config = Config()
+    vectorstore = LegislationVectorStore(config=config)
+    count = import_snapshot(
+        vectorstore, config.snapshot_dir, batch_size=config.write_batch_size
+    )
+    logger.info(
+        "Imported snapshot",
+        extra={"path": str(config.snapshot_dir), "records": count},
+    )
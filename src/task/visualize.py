@@ -7,8 +7,10 @@ import plotly.express as px
 from inflection import titleize
 
 from src.config import TOPICS, Config
+from src.profiling import profiled
 
 
+@profiled
 def main():
     config = Config()
     df = pd.read_csv(config.out_dir / "labeled_embeddings.csv")
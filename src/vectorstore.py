@@ -2,25 +2,91 @@
 # *-*- coding: utf-8 -*-
 """Chroma utilities."""
 
+import json
 import sqlite3
 from datetime import datetime
+from functools import cached_property
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Mapping, Optional, Tuple
 
-from chromadb import PersistentClient
+import numpy as np
+from chromadb import EmbeddingFunction, PersistentClient
+from chromadb.api.types import IncludeEnum, Metadata
 
 from src.config import Config
+from src.docstore import DocumentStore
+from src.fts import LexicalIndex
+from src.logging import logger
+
+
+# Settings of collections created without HNSW metadata
+HNSW_DEFAULTS = {
+    "hnsw:space": "l2",
+    "hnsw:M": 16,
+    "hnsw:construction_ef": 100,
+    "hnsw:search_ef": 100,
+}
+
+
+def hnsw_metadata(config: Config) -> Dict[str, Any]:
+    """Return the Chroma collection metadata for the configured HNSW index.
+
+    Args:
+        config: Configuration
+
+    Returns:
+        The `hnsw:*` collection metadata
+    """
+    return {
+        "hnsw:space": config.hnsw_space,
+        "hnsw:M": config.hnsw_m,
+        "hnsw:construction_ef": config.hnsw_construction_ef,
+        "hnsw:search_ef": config.hnsw_search_ef,
+    }
 
 
 class LegislationVectorStore:
-    def __init__(self, config: Config = Config()):
-        self.client = PersistentClient(config.db_dir.name)
-        self.collection = self.client.create_collection(
-            name="legislation", get_or_create=True
-        )
+    def __init__(
+        self,
+        config: Config = Config(),
+        embedding_function: Optional[EmbeddingFunction] = None,
+    ):
+        self.client = PersistentClient(str(config.db_dir))
+        metadata = hnsw_metadata(config)
+        if embedding_function is None:
+            self.collection = self.client.create_collection(
+                name="legislation", metadata=metadata, get_or_create=True
+            )
+        else:
+            self.collection = self.client.create_collection(
+                name="legislation",
+                metadata=metadata,
+                embedding_function=embedding_function,
+                get_or_create=True,
+            )
+        # HNSW settings are fixed when the collection is created
+        stored = {**HNSW_DEFAULTS, **(self.collection.metadata or {})}
+        if any(stored[key] != value for key, value in metadata.items()):
+            logger.warning(
+                "Vector store has different HNSW settings; export and import it to change them",
+                extra={"stored": stored, "requested": metadata},
+            )
+        # Chroma rejects writes of more records than this at once
+        self.max_batch_size = self.client.get_max_batch_size()
         self.db_dir = Path(config.db_dir)
+        self.compact = config.compact
         self._init_db()
 
+    @cached_property
+    def docstore(self) -> DocumentStore:
+        """The document store, created on first use, i.e. only in compact mode."""
+        return DocumentStore(self.db_dir / "documents.sqlite3")
+
+    @cached_property
+    def lexical_index(self) -> LexicalIndex:
+        """The full-text index, created on first use."""
+        return LexicalIndex(self.db_dir / "fts.sqlite3")
+
     def _init_db(self) -> None:
         """Initialize the database."""
         with sqlite3.connect(self.db_dir / "chroma.sqlite3") as conn:
@@ -67,29 +133,249 @@ class LegislationVectorStore:
             result = cursor.fetchone()
             return result is not None and result[0] == current_hash
 
-    def mark_file_processed(self, file_path: Path, metadata: Dict[str, Any]) -> None:
-        """Mark file as processed in state database.
+    def mark_files_processed(
+        self, files: List[Tuple[Path, str, Dict[str, Any]]]
+    ) -> None:
+        """Mark several files as processed in a single transaction.
+
+        The signature is passed in rather than read here, so that it is the
+        signature of the file as it was before it was read. The document text
+        is not part of the state, so it is dropped from the stored metadata.
 
         Args:
-            file_path: Path to the file
-            metadata: Metadata associated with the file
+            files: File path, file signature and the metadata associated with
+                the file
 
         Returns:
             None
         """
-        current_signature = self.get_file_signature(file_path)
+        processed_at = datetime.now().isoformat()
+        rows = [
+            (
+                str(file_path),
+                signature,
+                processed_at,
+                json.dumps({k: v for k, v in metadata.items() if k != "text"}),
+            )
+            for file_path, signature, metadata in files
+        ]
 
         with sqlite3.connect(self.db_dir / "chroma.sqlite3") as conn:
-            conn.execute(
+            conn.executemany(
                 """
                 INSERT OR REPLACE INTO processed_files 
                 (file_path, file_signature, processed_at, metadata) 
                 VALUES (?, ?, ?, ?)
                 """,
-                (
-                    str(file_path),
-                    current_signature,
-                    datetime.now().isoformat(),
-                    str(metadata),
-                ),
+                rows,
+            )
+
+    # noinspection SqlResolve
+    def iter_processed_files(
+        self, page_size: int = 1000
+    ) -> Iterator[List[Tuple[str, str, str, str]]]:
+        """Page through the processed file state.
+
+        Args:
+            page_size: Number of rows per page
+
+        Returns:
+            An iterator of pages of file path, file signature, processed-at
+            timestamp and JSON metadata rows
+        """
+        with sqlite3.connect(self.db_dir / "chroma.sqlite3") as conn:
+            cursor = conn.execute(
+                """
+                SELECT file_path, file_signature, processed_at, metadata
+                FROM processed_files ORDER BY file_path
+                """
+            )
+            while rows := cursor.fetchmany(page_size):
+                yield rows
+
+    # noinspection SqlResolve
+    def restore_processed_files(self, rows: List[Tuple[str, str, str, str]]) -> None:
+        """Restore processed file state rows as they were exported.
+
+        Unlike `mark_files_processed`, the stored signatures are kept, so the
+        source files do not need to exist on this machine.
+
+        Args:
+            rows: File path, file signature, processed-at timestamp and JSON
+                metadata rows
+
+        Returns:
+            None
+        """
+        with sqlite3.connect(self.db_dir / "chroma.sqlite3") as conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO processed_files
+                (file_path, file_signature, processed_at, metadata)
+                VALUES (?, ?, ?, ?)
+                """,
+                rows,
             )
+
+    def iter_records(
+        self, page_size: int = 1000
+    ) -> Iterator[Tuple[List[str], np.ndarray, List[Dict[str, Any]], List[str]]]:
+        """Page through the full records in the collection.
+
+        The records are independent of `--compact`: the text of compact
+        documents is read from the document store and `doc_hash` is dropped
+        from the metadata, so they can be written to any store with
+        `add_records`.
+
+        Args:
+            page_size: Number of records per page
+
+        Returns:
+            An iterator of ids, a float32 array of embeddings, the metadata and
+            the document text for each page
+        """
+        offset = 0
+        while True:
+            result = self.collection.get(
+                limit=page_size,
+                offset=offset,
+                include=[
+                    IncludeEnum.embeddings,
+                    IncludeEnum.metadatas,
+                    IncludeEnum.documents,
+                ],
+            )
+            if not result["ids"]:
+                return
+            count = len(result["ids"])
+            metadatas = [dict(m or {}) for m in result["metadatas"] or [{}] * count]
+            documents = result["documents"] or [""] * count
+            hashes = [str(m["doc_hash"]) for m in metadatas if "doc_hash" in m]
+            stored = self.docstore.get_many(hashes) if hashes else {}
+            texts = [
+                (stored.get(str(m.pop("doc_hash"))) if "doc_hash" in m else document)
+                or ""
+                for m, document in zip(metadatas, documents)
+            ]
+            yield (
+                result["ids"],
+                np.asarray(result["embeddings"], dtype=np.float32),
+                metadatas,
+                texts,
+            )
+            offset += len(result["ids"])
+
+    def upsert(
+        self,
+        ids: List[str],
+        embeddings: np.ndarray,
+        metadatas: List[Dict[str, Any]],
+        texts: List[str],
+    ) -> List[Dict[str, Any]]:
+        """Upsert records with precomputed embeddings.
+
+        In compact mode the text is written to the document store and only
+        its `doc_hash` to Chroma. Records are written in chunks of at most
+        `max_batch_size`.
+
+        Args:
+            ids: Record ids
+            embeddings: (n, d) embeddings
+            metadatas: Metadata of each record, without `doc_hash`
+            texts: Document text of each record
+
+        Returns:
+            The metadata of each record as it was stored
+        """
+        stored: List[Metadata] = [dict(m) for m in metadatas]
+        documents: Optional[List[str]] = list(texts)
+        if self.compact:
+            hashes = self.docstore.put_many(list(texts))
+            stored = [{**m, "doc_hash": digest} for m, digest in zip(stored, hashes)]
+            documents = None
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        for start in range(0, len(ids), self.max_batch_size):
+            end = start + self.max_batch_size
+            self.collection.upsert(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end],
+                metadatas=stored[start:end],
+                documents=documents[start:end] if documents is not None else None,
+            )
+        return [dict(m) for m in stored]
+
+    def get_texts(self, metadatas: List[Mapping[str, Any]]) -> List[str]:
+        """Fetch the document text of search or get results.
+
+        Text of documents written in compact mode is read from the document
+        store by its `doc_hash`; otherwise it is read from the collection.
+
+        Args:
+            metadatas: Metadata of the documents
+
+        Returns:
+            The text of each document, or an empty string if it is not stored
+        """
+        hashes = [m["doc_hash"] for m in metadatas if "doc_hash" in m]
+        texts = self.docstore.get_many(hashes) if hashes else {}
+        ids = [m["file_name"] for m in metadatas if "doc_hash" not in m]
+        if ids:
+            result = self.collection.get(ids=ids, include=[IncludeEnum.documents])
+            texts.update(zip(result["ids"], result["documents"] or []))
+        return [
+            texts.get(m["doc_hash"] if "doc_hash" in m else m["file_name"]) or ""
+            for m in metadatas
+        ]
+
+    def iter_embeddings(
+        self, page_size: int = 1000, include_metadatas: bool = False
+    ) -> Iterator[Tuple[List[str], np.ndarray, Optional[List[Metadata]]]]:
+        """Page through the embeddings in the collection.
+
+        Args:
+            page_size: Number of embeddings per page
+            include_metadatas: Whether to also fetch the metadata
+
+        Returns:
+            An iterator of ids, a float32 array of embeddings and the metadata
+            (or None) for each page
+        """
+        include = [IncludeEnum.embeddings]
+        if include_metadatas:
+            include.append(IncludeEnum.metadatas)
+        offset = 0
+        while True:
+            result = self.collection.get(
+                limit=page_size, offset=offset, include=include
+            )
+            if not result["ids"]:
+                return
+            yield (
+                result["ids"],
+                np.asarray(result["embeddings"], dtype=np.float32),
+                result["metadatas"],
+            )
+            offset += len(result["ids"])
+
+    def add_records(
+        self,
+        ids: List[str],
+        embeddings: np.ndarray,
+        metadatas: List[Dict[str, Any]],
+        texts: List[str],
+    ) -> None:
+        """Upsert records with precomputed embeddings and index their text.
+
+        Args:
+            ids: Record ids
+            embeddings: (n, d) embeddings
+            metadatas: Metadata of each record, without `doc_hash`
+            texts: Document text of each record
+
+        Returns:
+            None
+        """
+        stored = self.upsert(ids, embeddings, metadatas, texts)
+        self.lexical_index.add_many(
+            [{**m, "text": text} for m, text in zip(stored, texts) if "file_name" in m]
+        )
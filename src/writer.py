@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Vector store writer."""
+
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, Callable, List, Optional
+
+import numpy as np
+
+from src.logging import logger
+from src.metrics import metrics
+from src.vectorstore import LegislationVectorStore
+
+
+class VectorStoreWriter:
+    """Write-behind buffer in front of the vector store.
+
+    Embedded records are buffered and written with `collection.upsert` once
+    `batch_size` records are pending or the oldest pending record is
+    `interval` seconds old, independent of the parse batch size. Files are
+    marked processed only after the upsert that contains them has returned,
+    with the `signature` their record carries from before they were read,
+    and then `on_flush` is called with the tags of the batches written.
+    """
+
+    def __init__(
+        self,
+        vectorstore: LegislationVectorStore,
+        batch_size: int = 1000,
+        interval: float = 10.0,
+        on_flush: Optional[Callable[[List[Any]], None]] = None,
+    ):
+        self.vectorstore = vectorstore
+        self.batch_size = batch_size
+        self.interval = interval
+        self.on_flush = on_flush
+        self._lock = threading.RLock()
+        self._records: List[Dict[str, Any]] = []
+        self._embeddings: List[np.ndarray] = []
+        self._batches: List[Any] = []
+        self._oldest: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def start(self) -> None:
+        """Start the background thread that flushes by time."""
+        if self._thread is None and self.interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval / 2):
+            with self._lock:
+                due = (
+                    self._oldest is not None
+                    and time.monotonic() - self._oldest >= self.interval
+                )
+            if due:
+                try:
+                    self.flush()
+                except Exception as e:
+                    # Records stay buffered and are retried on the next flush
+                    logger.error("Error flushing vector store writer", exc_info=e)
+
+    def put(
+        self,
+        records: List[Dict[str, Any]],
+        embeddings: np.ndarray,
+        batch: Optional[Any] = None,
+    ) -> None:
+        """Buffer embedded records, flushing if the buffer is full.
+
+        Args:
+            records: Parsed legislation records, each with `text`, `file_name`,
+                `source` and `signature`
+            embeddings: Embedding of each record
+            batch: Optional tag of the batch, passed to `on_flush` once written
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._records.extend(records)
+            self._embeddings.extend(embeddings)
+            if batch is not None:
+                self._batches.append(batch)
+            metrics.set("write_queue_depth", len(self._records))
+            full = len(self._records) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """Upsert all buffered records and then mark their files processed.
+
+        Returns:
+            The number of records written
+        """
+        with self._lock:
+            if not self._records:
+                return 0
+            # Chroma rejects duplicate ids in one upsert, so a file queued
+            # twice is written once, with its latest record
+            latest = {r["file_name"]: i for i, r in enumerate(self._records)}
+            rows = sorted(latest.values())
+            records = [self._records[i] for i in rows]
+            batches = self._batches
+            with metrics.timer("write_ms"):
+                metadatas = self.vectorstore.upsert(
+                    [r["file_name"] for r in records],
+                    np.asarray(self._embeddings, dtype=np.float32)[rows],
+                    [
+                        {k: v for k, v in r.items() if k not in ("text", "signature")}
+                        for r in records
+                    ],
+                    [r["text"] for r in records],
+                )
+            with metrics.timer("fts_ms"):
+                self.vectorstore.lexical_index.add_many(records)
+            # The upsert has been committed, so acknowledge the files
+            self.vectorstore.mark_files_processed(
+                [
+                    (Path(r["source"]), r["signature"], m)
+                    for r, m in zip(records, metadatas)
+                ]
+            )
+            if batches and self.on_flush is not None:
+                self.on_flush(batches)
+            self._records, self._embeddings, self._batches = [], [], []
+            self._oldest = None
+            metrics.set("write_queue_depth", 0)
+            metrics.inc("records_written", len(records))
+            metrics.inc("files_processed", len(records))
+            logger.info("Flushed vector store writer", extra={"records": len(records)})
+            return len(records)
+
+    def close(self) -> None:
+        """Stop the background thread and flush any buffered records."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def __enter__(self) -> "VectorStoreWriter":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
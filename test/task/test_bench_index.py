@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test HNSW index benchmark."""
+import numpy as np
+
+from src.task.bench_index import bench_index, exact_topk
+
+
+class TestBenchIndex:
+
+    def test_exact_topk(self):
+        rng = np.random.default_rng(0)
+        corpus = rng.standard_normal((100, 8)).astype(np.float32)
+        queries = rng.standard_normal((10, 8)).astype(np.float32)
+        distances = ((queries[:, None] - corpus[None]) ** 2).sum(axis=2)
+        expected = np.argsort(distances, axis=1)[:, :5]
+        assert (exact_topk(corpus, queries, 5, "l2", block_size=3) == expected).all()
+
+    def test_bench_index(self, tmp_path):
+        rng = np.random.default_rng(0)
+        corpus = rng.standard_normal((200, 8)).astype(np.float32)
+        ids = [f"BILLS-{i}.xml" for i in range(200)]
+        queries = rng.standard_normal((20, 8)).astype(np.float32)
+        truth = exact_topk(corpus, queries, 5, "cosine")
+        result = bench_index(
+            ids, corpus, queries, truth, tmp_path, "cosine", 16, 100, 100, batch_size=64
+        )
+        assert result["recall_at_5"] > 0.9
+        assert result["index_bytes"] > 0
+        assert result["p99_ms"] >= result["p50_ms"] > 0
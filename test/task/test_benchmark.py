@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test benchmark suite."""
+from src.config import Config
+from src.task.benchmark import BenchmarkSuite, HashingEmbedder, compare, measure
+
+
+class TestBenchmark:
+
+    def test_compare(self):
+        baseline = {"search": {"median_s": 1.0}, "parse_file": {"median_s": 1.0}}
+        results = {
+            "search": {"median_s": 1.3},
+            "parse_file": {"median_s": 1.1},
+            "dedupe": {"median_s": 9.0},
+        }
+        assert compare(results, baseline, threshold=0.25) == ["search"]
+        assert compare(results, baseline, threshold=0.5) == []
+
+    def test_measure(self):
+        calls = []
+        result = measure(calls.append, repeat=3, items=10, setup=lambda: "arg")
+        assert calls == ["arg"] * 3
+        assert result["items"] == 10
+        assert result["min_s"] <= result["median_s"]
+
+    def test_hashing_embedder(self):
+        embedder = HashingEmbedder()
+        vectors = embedder.embed(["a", "b", "a"])
+        assert (vectors[0] == vectors[2]).all()
+        assert embedder.stats.documents == 3
+        assert len(embedder(["a"])) == 1
+
+    def test_suite(self, tmp_path):
+        config = Config().model_copy(
+            update={"bench_docs": 10, "bench_repeat": 1, "bench_sections": 1}
+        )
+        suite = BenchmarkSuite(config, tmp_path)
+        processor = suite._processor()
+        suite._process(processor, suite.files)
+        store = processor.vectorstore
+        assert store.collection.count() == 10
+
+        results = {
+            "parse_file": suite.bench_parse_file(),
+            "process_batch": suite.bench_process_batch(),
+            "search": suite.bench_search(store),
+            **suite.bench_citation_search(store),
+            "snapshot_import": suite.bench_snapshot_import(store),
+        }
+        assert all(result["repeat"] == 1 for result in results.values())
+        assert results["parse_file"]["items"] == 10
+        assert results["citation_search_lexical"]["recall_at_5"] > 0.5
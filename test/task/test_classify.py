@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test topic classification."""
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDClassifier
+
+from src.config import Config
+from src.task.classify import TopicClassifier, classify_all, load_labels, topic_key, train
+from src.vectorstore import LegislationVectorStore
+
+
+class TestClassify:
+
+    def test_train_and_classify(self, tmp_path):
+        config = Config().model_copy(update={"db_dir": tmp_path / "embeddings"})
+        vectorstore = LegislationVectorStore(config=config)
+        rng = np.random.default_rng(0)
+        topics = ["economy", "national security"]
+        vectors = np.vstack([np.eye(8)[t] * 3 + rng.standard_normal((30, 8)) * 0.3 for t in range(2)])
+        ids = [f"BILLS-{i}.xml" for i in range(60)]
+        vectorstore.collection.add(
+            ids=ids, embeddings=vectors, metadatas=[{"file_name": i} for i in ids]
+        )
+
+        # Label a few examples of each topic, as `label` does
+        df = pd.DataFrame({"id": ids, "economy": 0, "national security": 0})
+        df.loc[:4, "economy"] = 1
+        df.loc[30:34, "national security"] = 1
+        df.to_csv(tmp_path / "labeled_embeddings.csv", index=False)
+        labels = load_labels(vectorstore, topics, tmp_path / "labeled_embeddings.csv")
+        assert len(labels) == 10
+
+        model = train(vectorstore, topics, labels, page_size=4, epochs=10)
+        model.save(tmp_path / "classifier")
+        model = TopicClassifier.load(tmp_path / "classifier")
+        assert classify_all(model, vectorstore, page_size=7).tolist() == [30, 30]
+
+        result = vectorstore.collection.get(ids=["BILLS-45.xml"], include=["metadatas"])
+        metadata = result["metadatas"][0]
+        assert metadata["file_name"] == "BILLS-45.xml"
+        assert metadata["topic"] == "national security"
+        assert metadata[topic_key("national security")] > metadata[topic_key("economy")]
+
+    def test_predict_proba_matches_sklearn(self):
+        rng = np.random.default_rng(1)
+        topics = ["economy", "health", "national security", "education"]
+        labels = np.repeat(np.arange(4), 20)
+        vectors = np.eye(8)[labels] * 2 + rng.standard_normal((80, 8))
+        classifier = SGDClassifier(loss="log_loss", random_state=0).fit(vectors, labels)
+
+        # Multiclass models normalize the one-vs-rest probabilities per row
+        model = TopicClassifier(topics, classifier.coef_, classifier.intercept_)
+        assert np.allclose(
+            model.predict_proba(vectors), classifier.predict_proba(vectors), atol=1e-5
+        )
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test topic clustering."""
+import numpy as np
+
+from src.config import Config
+from src.task.cluster import ClusterModel, assign_all, fit_kmeans
+from src.vectorstore import LegislationVectorStore
+
+
+class TestCluster:
+
+    def test_fit_and_assign(self, tmp_path):
+        config = Config().model_copy(update={"db_dir": tmp_path / "embeddings"})
+        vectorstore = LegislationVectorStore(config=config)
+        rng = np.random.default_rng(0)
+        centers = np.eye(8)[:3] * 10
+        vectors = np.vstack([c + rng.standard_normal((20, 8)) for c in centers])
+        ids = [f"BILLS-{i}.xml" for i in range(60)]
+        order = rng.permutation(60)
+        vectorstore.collection.add(
+            ids=[ids[i] for i in order],
+            embeddings=vectors[order],
+            metadatas=[{"file_name": ids[i]} for i in order],
+        )
+
+        model = fit_kmeans(vectorstore, n_clusters=3, page_size=4, epochs=5)
+        model.save(tmp_path / "clusters")
+        model = ClusterModel.load(tmp_path / "clusters")
+        assert (assign_all(model, vectorstore, page_size=7) == 20).all()
+
+        result = vectorstore.collection.get(ids=ids, include=["metadatas"])
+        assert all(m["file_name"] for m in result["metadatas"])
+        by_id = {m["file_name"]: m["cluster"] for m in result["metadatas"]}
+        labels = [by_id[idx] for idx in ids]
+        assert len(set(labels[:20])) == len(set(labels[20:40])) == 1
+        assert len(set(labels)) == 3
@@ -1,6 +1,19 @@
 #!/usr/bin/env python3
 # *-*- coding: utf-8 -*
-from src.task.processor import BatchProcessor
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from src.config import Config
+from src.embedding import EmbeddingStats, HashingEncoder
+from src.metrics import metrics
+from src.synthetic import SyntheticBillGenerator
+from src.shard import ShardedVectorStore
+from src.task.processor import BatchProcessor, DataProcessor, process_sharded
 
 
 class TestBatchProcessor:
@@ -8,4 +21,145 @@ class TestBatchProcessor:
     def test_process_files(self):
         processor = BatchProcessor()
         result = processor.process_files(["test/fixtures/BILLS-117hres24rds.xml"], lambda x: x)
-        assert result == result
+        assert result == ["test/fixtures/BILLS-117hres24rds.xml"]
+
+    def test_parse_queue_depth(self):
+        release = threading.Event()
+        processor = BatchProcessor(max_workers=2)
+        thread = threading.Thread(
+            target=processor.process_files,
+            args=(list(range(5)), lambda _: release.wait()),
+        )
+        thread.start()
+        # All five tasks are in flight until they are released
+        deadline = time.monotonic() + 5
+        while metrics.gauges.get("parse_queue_depth") != 5:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        release.set()
+        thread.join()
+        assert metrics.gauges["parse_queue_depth"] == 0
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.stats = EmbeddingStats()
+        self.calls = 0
+
+    def embed(self, documents):
+        self.calls += 1
+        return np.random.default_rng(self.calls).standard_normal((len(documents), 8))
+
+    def close(self):
+        pass
+
+
+class TestDataProcessor:
+
+    def test_resume_after_crash(self, tmp_path, caplog):
+        SyntheticBillGenerator(seed=0, sections=1).write_corpus(tmp_path / "data", 10)
+        config = Config().model_copy(
+            update={
+                "data_dir": tmp_path / "data",
+                "db_dir": tmp_path / "embeddings",
+                "batch_size": 3,
+                "write_batch_size": 100,
+                "write_interval": 0,
+                "dedupe": False,
+                "limit": 0,
+            }
+        )
+        (tmp_path / "embeddings").mkdir()
+
+        # Crash on the third batch, after two batches were embedded but never written
+        embedder = CountingEmbedder()
+        processor = DataProcessor(config=config, embedder=embedder)
+        processor.writer.flush = lambda: 0
+        process_batch = processor.process_batch
+
+        def crash(files, batch=None):
+            if batch == 2:
+                raise KeyboardInterrupt
+            process_batch(files, batch)
+
+        processor.process_batch = crash
+        with pytest.raises(KeyboardInterrupt):
+            processor.process_all()
+        assert processor.vectorstore.collection.count() == 0
+
+        # A different batch size does not change the plan of the resumed run
+        embedder = CountingEmbedder()
+        processor = DataProcessor(
+            config=config.model_copy(update={"batch_size": 5}), embedder=embedder
+        )
+        with caplog.at_level(logging.WARNING, logger="src.logging"):
+            processor.process_all()
+        assert "different files or batch size" in caplog.text
+        assert len(processor.journal.batches(1)) == 4
+        assert embedder.calls == 2
+        assert processor.vectorstore.collection.count() == 10
+        assert processor.journal.open_run() is None
+        assert list((tmp_path / "embeddings" / "journal").glob("*.json")) == []
+
+    def test_autotune(self, tmp_path):
+        SyntheticBillGenerator(seed=0, sections=1).write_corpus(tmp_path / "data", 10)
+        config = Config().model_copy(
+            update={
+                "data_dir": tmp_path / "data",
+                "db_dir": tmp_path / "embeddings",
+                "autotune": True,
+                "autotune_min_batch_size": 2,
+                "batch_size": 4,
+                "write_interval": 0,
+                "dedupe": False,
+                "limit": 0,
+            }
+        )
+        (tmp_path / "embeddings").mkdir()
+
+        embedder = CountingEmbedder()
+        processor = DataProcessor(config=config, embedder=embedder)
+        processor.process_all()
+        # Batches of two files are planned and processed several at a time
+        assert len(processor.journal.batches(1)) == 5
+        assert embedder.calls < 5
+        assert processor.autotuner.decisions
+        assert processor.vectorstore.collection.count() == 10
+        assert processor.journal.open_run() is None
+
+        tuner = DataProcessor._autotuner(
+            config.model_copy(update={"autotune_max_workers": 3})
+        )
+        assert tuner.bounds["workers"] == (1, 3)
+
+    def test_process_sharded(self, tmp_path):
+        generator = SyntheticBillGenerator(seed=0, sections=1)
+        files = generator.write_corpus(tmp_path / "data", 12, congresses=[117, 118])
+        config = Config().model_copy(
+            update={
+                "data_dir": tmp_path / "data",
+                "db_dir": tmp_path / "embeddings",
+                "out_dir": tmp_path / "out",
+                "shard_by": "congress",
+                "shard_workers": 2,
+                "embed_workers": 2,
+                "batch_size": 4,
+                "write_interval": 0,
+                "metrics_interval": 0,
+                "dedupe": False,
+                "limit": 0,
+            }
+        )
+
+        processed = process_sharded(config, files, encoder=HashingEncoder)
+        expected = ShardedVectorStore(config=config).partition(files)
+        assert processed == {name: len(f) for name, f in expected.items()}
+        store = ShardedVectorStore(config=config)
+        assert store.names == sorted(expected)
+        for name, shard_files in expected.items():
+            assert store.shard(name).collection.count() == len(shard_files)
+            # Each shard process exports the metrics of its own shard
+            snapshot = json.loads(
+                (tmp_path / "out" / f"metrics-shard-{name}.json").read_text()
+            )
+            assert snapshot["counters"]["files_processed"] == len(shard_files)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test similar legislation graph."""
+import sys
+
+import numpy as np
+import pytest
+
+from src.config import Config
+from src.task.similar import SimilarityGraph, blocked_topk, main, normalize
+from src.vectorstore import LegislationVectorStore
+
+
+def brute_force(vectors, k):
+    sims = vectors @ vectors.T
+    np.fill_diagonal(sims, -np.inf)
+    return np.argsort(-sims, axis=1)[:, :k]
+
+
+class TestSimilar:
+
+    def test_blocked_topk(self):
+        vectors = normalize(np.random.default_rng(0).standard_normal((50, 8)))
+        rows = np.arange(50)
+        scores, indices = blocked_topk(vectors, rows, vectors, rows, k=3, block_size=7)
+        assert (indices == brute_force(vectors, 3)).all()
+        assert (np.diff(scores, axis=1) <= 0).all()
+
+    def test_incremental_update(self, tmp_path):
+        config = Config().model_copy(update={"db_dir": tmp_path / "embeddings"})
+        vectorstore = LegislationVectorStore(config=config)
+        vectors = normalize(np.random.default_rng(1).standard_normal((40, 8)))
+        ids = [f"BILLS-{i}.xml" for i in range(40)]
+
+        graph = SimilarityGraph.empty(k=4)
+        vectorstore.collection.add(ids=ids[:25], embeddings=vectors[:25])
+        assert graph.update(vectorstore, page_size=10, block_size=6) == 25
+        vectorstore.collection.add(ids=ids[25:], embeddings=vectors[25:])
+        assert graph.update(vectorstore, page_size=10, block_size=6) == 15
+        assert graph.update(vectorstore) == 0
+
+        graph.save(tmp_path / "similar")
+        graph = SimilarityGraph.load(tmp_path / "similar")
+        expected = brute_force(vectors, 4)
+        for i, idx in enumerate(ids):
+            assert [n for n, _ in graph.neighbors(idx)] == [ids[j] for j in expected[i]]
+
+    def test_update_changed_and_deleted(self, tmp_path):
+        config = Config().model_copy(update={"db_dir": tmp_path / "embeddings"})
+        vectorstore = LegislationVectorStore(config=config)
+        rng = np.random.default_rng(2)
+        vectors = normalize(rng.standard_normal((30, 8)))
+        ids = [f"BILLS-{i}.xml" for i in range(30)]
+        vectorstore.collection.add(ids=ids, embeddings=vectors)
+        graph = SimilarityGraph.empty(k=4)
+        graph.update(vectorstore, page_size=10, block_size=6)
+        graph.save(tmp_path / "similar")
+        graph = SimilarityGraph.load(tmp_path / "similar")
+
+        # Re-upsert some documents with new embeddings and delete others
+        vectors[:5] = normalize(rng.standard_normal((5, 8)))
+        vectorstore.collection.upsert(ids=ids[:5], embeddings=vectors[:5])
+        vectorstore.collection.delete(ids=ids[25:])
+        assert graph.update(vectorstore, page_size=10, block_size=6) >= 10
+        assert graph.update(vectorstore) == 0
+
+        ids, vectors = ids[:25], vectors[:25]
+        assert len(graph) == 25
+        assert "BILLS-29.xml" not in graph
+        expected = brute_force(vectors, 4)
+        for i, idx in enumerate(ids):
+            assert [n for n, _ in graph.neighbors(idx)] == [ids[j] for j in expected[i]]
+
+    def test_main_unknown_bill_id(self, tmp_path, monkeypatch):
+        argv = ["similar", "--db_dir", str(tmp_path), "--bill_id", "BILLS-0.xml"]
+        monkeypatch.setattr(sys, "argv", argv)
+        with pytest.raises(SystemExit) as exc:
+            main()
+        assert exc.value.code == 1
+
+    def test_main_reads_saved_graph(self, tmp_path, monkeypatch):
+        config = Config().model_copy(update={"db_dir": tmp_path})
+        vectorstore = LegislationVectorStore(config=config)
+        vectors = normalize(np.random.default_rng(3).standard_normal((6, 8)))
+        ids = [f"BILLS-{i}.xml" for i in range(6)]
+        metadatas = [{"file_name": i, "dc_title": i} for i in ids]
+        vectorstore.collection.add(
+            ids=ids[:5], embeddings=vectors[:5], metadatas=metadatas[:5]
+        )
+        graph = SimilarityGraph.empty(k=2)
+        graph.update(vectorstore)
+        graph.save(tmp_path / "similar")
+        vectorstore.collection.add(
+            ids=ids[5:], embeddings=vectors[5:], metadatas=metadatas[5:]
+        )
+
+        argv = ["similar", "--db_dir", str(tmp_path), "--bill_id", "BILLS-5.xml"]
+        monkeypatch.setattr(sys, "argv", argv)
+        with pytest.raises(SystemExit):
+            main()
+        assert len(SimilarityGraph.load(tmp_path / "similar")) == 5
+
+        monkeypatch.setattr(sys, "argv", argv + ["--rebuild", "true"])
+        main()
+        assert len(SimilarityGraph.load(tmp_path / "similar")) == 6
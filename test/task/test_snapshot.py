@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test snapshot export and import."""
+import numpy as np
+import pytest
+
+from src.config import Config
+from src.task.snapshot import export_snapshot, import_snapshot
+from src.vectorstore import LegislationVectorStore
+
+
+def make_store(path, compact=False):
+    config = Config().model_copy(update={"db_dir": path, "compact": compact})
+    return LegislationVectorStore(config=config)
+
+
+class TestSnapshot:
+
+    @pytest.fixture
+    def snapshot(self, tmp_path):
+        store = make_store(tmp_path / "source")
+        ids = [f"BILLS-118hr{i}ih.xml" for i in range(25)]
+        store.collection.add(
+            ids=ids,
+            embeddings=np.random.default_rng(0).standard_normal((25, 8)),
+            metadatas=[{"file_name": idx, "dc_title": f"Act {i}"} for i, idx in enumerate(ids)],
+            documents=[f"text of bill number {i}" for i in range(25)],
+        )
+        store.restore_processed_files(
+            [(f"data/{idx}", "1_2", "2025-01-01T00:00:00", "{}") for idx in ids]
+        )
+        manifest = export_snapshot(store, tmp_path / "snapshot", page_size=10)
+        assert manifest["count"] == 25 and len(manifest["parts"]) == 3
+        return store, tmp_path / "snapshot"
+
+    def test_round_trip(self, tmp_path, snapshot):
+        source, path = snapshot
+        target = make_store(tmp_path / "target", compact=True)
+        assert import_snapshot(target, path, batch_size=7) == 25
+
+        expected = source.collection.get(include=["embeddings", "metadatas", "documents"])
+        result = target.collection.get(
+            ids=expected["ids"], include=["embeddings", "metadatas"]
+        )
+        by_id = dict(zip(result["ids"], zip(result["embeddings"], result["metadatas"])))
+        texts = target.get_texts([by_id[idx][1] for idx in expected["ids"]])
+        for idx, embedding, document, text in zip(
+            expected["ids"], expected["embeddings"], expected["documents"], texts
+        ):
+            assert np.allclose(by_id[idx][0], embedding)
+            assert text == document
+        assert target.lexical_index.search("bill number 7")[0][0] == "BILLS-118hr7ih.xml"
+        assert sum(len(rows) for rows in target.iter_processed_files()) == 25
+
+    def test_corrupt_snapshot(self, tmp_path, snapshot):
+        _, path = snapshot
+        with open(path / "part-00001.npy", "r+b") as f:
+            f.seek(-1, 2)
+            last = f.read(1)[0]
+            f.seek(-1, 2)
+            f.write(bytes([last ^ 0xFF]))
+        with pytest.raises(ValueError, match="Checksum mismatch"):
+            import_snapshot(make_store(tmp_path / "target"), path)
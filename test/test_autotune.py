@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test concurrency autotuning."""
+from src.autotune import Autotuner
+
+
+class TestAutotuner:
+
+    def test_hill_climb(self):
+        tuner = Autotuner(workers=4, batch_size=100, memory_ceiling=1000, max_workers=8)
+        tuner.observe(100, 1.0, 0)
+        assert tuner.batch_size == 150
+
+        # Faster, so keep growing the batch size
+        tuner.observe(150, 1.0, 0)
+        assert tuner.batch_size == 225
+
+        # Slower, so undo the last step and move on to the worker count
+        tuner.observe(225, 3.0, 0)
+        assert (tuner.batch_size, tuner.workers) == (150, 5)
+        assert [d["reason"] for d in tuner.decisions] == [
+            "explore",
+            "explore",
+            "slower",
+            "explore",
+        ]
+
+    def test_memory_ceiling(self):
+        tuner = Autotuner(workers=4, batch_size=100, memory_ceiling=1000, max_workers=8)
+        tuner.observe(100, 1.0, 2000)
+        assert tuner.batch_size == 50
+        assert tuner.decisions[-1]["reason"] == "memory"
+
+        # Close to the ceiling, the batch size is not grown
+        tuner.observe(50, 1.0, 900)
+        assert tuner.batch_size <= 50
+
+    def test_bounds(self):
+        tuner = Autotuner(
+            workers=1,
+            batch_size=10,
+            memory_ceiling=1000,
+            max_workers=1,
+            min_batch_size=10,
+            max_batch_size=10,
+        )
+        tuner.observe(10, 1.0, 0)
+        assert (tuner.workers, tuner.batch_size) == (1, 10)
+        assert tuner.decisions == []
@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test document store."""
+from src.docstore import DocumentStore
+
+
+class TestDocumentStore:
+
+    def test_put_and_get(self, tmp_path):
+        store = DocumentStore(tmp_path / "documents.sqlite3")
+        hashes = store.put_many(["Resolved, That", "A BILL", "Resolved, That"])
+        assert hashes[0] == hashes[2] == DocumentStore.content_hash("Resolved, That")
+        assert store.get_many(hashes) == {
+            hashes[0]: "Resolved, That",
+            hashes[1]: "A BILL",
+        }
+        assert store.get_many(["missing"]) == {}
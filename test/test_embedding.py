@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test embedding utilities."""
+import os
+
+import numpy as np
+
+from src.embedding import (
+    EMBEDDING_DIM,
+    EmbeddingPool,
+    EmbeddingStats,
+    HashingEncoder,
+    plan_batches,
+)
+
+
+class TestPlanBatches:
+
+    def test_batches_respect_token_budget(self):
+        lengths = [10, 200, 12, 180, 11, 256]
+        batches = plan_batches(lengths, token_budget=400)
+        for batch in batches:
+            assert len(batch) * max(lengths[i] for i in batch) <= 400
+        assert sorted(i for batch in batches for i in batch) == list(range(6))
+
+    def test_batches_group_similar_lengths(self):
+        lengths = [100, 5, 100, 5]
+        assert plan_batches(lengths, token_budget=200) == [[1, 3], [0, 2]]
+
+    def test_oversized_input_gets_own_batch(self):
+        assert plan_batches([256, 256], token_budget=100) == [[0], [1]]
+
+
+class TestEmbeddingStats:
+
+    def test_rates(self):
+        stats = EmbeddingStats(documents=10, tokens=75, padded_tokens=100, seconds=2)
+        assert stats.docs_per_second == 5
+        assert stats.padding_waste == 0.25
+        assert EmbeddingStats().padding_waste == 0.0
+
+
+def shared_memory_blocks():
+    return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+
+
+class TestEmbeddingPool:
+
+    def test_two_workers(self):
+        documents = [f"document {i} " * (i % 5 + 1) for i in range(9)]
+        expected, _ = HashingEncoder().encode(documents)
+        shm_before = shared_memory_blocks()
+
+        pool = EmbeddingPool(workers=2, encoder=HashingEncoder)
+        embeddings = pool.embed(documents)
+        processes = list(pool.executor._processes.values())
+        assert len(processes) == 2
+        assert all(p.is_alive() for p in processes)
+        # Rows come back in the input order although shards are dealt longest first
+        np.testing.assert_array_equal(embeddings, expected)
+        assert pool.stats.documents == 9
+        assert shared_memory_blocks() == shm_before
+
+        pool.close()
+        assert pool._executor is None
+        assert not any(p.is_alive() for p in processes)
+
+    def test_empty(self):
+        with EmbeddingPool(workers=2, encoder=HashingEncoder) as pool:
+            assert pool.embed([]).shape == (0, EMBEDDING_DIM)
+            assert pool._executor is None
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test full-text search."""
+import sqlite3
+
+from src.fts import LexicalIndex
+from src.task.search import reciprocal_rank_fusion
+
+RECORDS = [
+    {
+        "file_name": "BILLS-118hr1234ih.xml",
+        "dc_title": "118 HR 1234 IH: Small Business Act Amendments",
+        "legis_num": "H. R. 1234",
+        "text": "Section 8(a) of the Small Business Act is amended.",
+    },
+    {
+        "file_name": "BILLS-118s55is.xml",
+        "dc_title": "118 S 55 IS: Farm Support Act",
+        "legis_num": "S. 55",
+        "text": "The Secretary of Agriculture shall make grants.",
+    },
+]
+
+
+class TestLexicalIndex:
+
+    def test_to_match_query(self):
+        assert LexicalIndex.to_match_query("H.R. 1234") == '"H" "R" "1234"'
+        assert LexicalIndex.to_match_query("()") == ""
+
+    def test_search(self, tmp_path):
+        index = LexicalIndex(tmp_path / "fts.sqlite3")
+        index.add_many(RECORDS)
+        assert [f for f, _ in index.search("H.R. 1234")] == ["BILLS-118hr1234ih.xml"]
+        assert [f for f, _ in index.search("Section 8(a)")] == ["BILLS-118hr1234ih.xml"]
+        assert [f for f, _ in index.search("agriculture")] == ["BILLS-118s55is.xml"]
+
+    def test_reindex(self, tmp_path):
+        index = LexicalIndex(tmp_path / "fts.sqlite3")
+        index.add_many(RECORDS)
+        index.add_many([{**RECORDS[1], "text": "Rural broadband."}])
+        assert index.search("agriculture") == []
+        assert [f for f, _ in index.search("broadband")] == ["BILLS-118s55is.xml"]
+
+        # Re-indexing replaces the row rather than adding one
+        index.add_many([{**RECORDS[1], "text": "Rural broadband."}] * 3)
+        with sqlite3.connect(index.path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM fts").fetchone()[0] == 2
+            assert conn.execute("SELECT COUNT(*) FROM fts_files").fetchone()[0] == 2
+            # No stale terms remain in the index vocabulary
+            conn.execute(
+                "CREATE VIRTUAL TABLE vocab USING fts5vocab(fts, 'row')"
+            )
+            terms = {term for (term,) in conn.execute("SELECT term FROM vocab")}
+        assert "agricultur" not in terms
+
+
+class TestReciprocalRankFusion:
+
+    def test_fusion(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]])
+        assert fused[0] == "a"
+        assert set(fused) == {"a", "b", "c", "d"}
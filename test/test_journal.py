@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test batch journal."""
+from pathlib import Path
+
+import numpy as np
+
+from src.journal import COMMITTED, EMBEDDED, PENDING, STARTED, BatchJournal
+
+
+class TestBatchJournal:
+
+    def test_run_lifecycle(self, tmp_path):
+        journal = BatchJournal(tmp_path / "journal")
+        assert journal.open_run() is None
+        run_id = journal.start_run([[Path("a.xml"), Path("b.xml")], [Path("c.xml")]])
+        assert journal.open_run() == run_id
+
+        journal.mark(run_id, [0], STARTED)
+        journal.spool(run_id, 0, [{"file_name": "a.xml"}], np.ones((1, 4)))
+        records, embeddings = journal.load_spool(run_id, 0)
+        assert records == [{"file_name": "a.xml"}]
+        assert embeddings.shape == (1, 4)
+        assert [state for _, _, state in journal.batches(run_id)] == [EMBEDDED, PENDING]
+        assert not journal.finish_run(run_id)
+
+        journal.commit(run_id, [0, 1])
+        assert [state for _, _, state in journal.batches(run_id)] == [COMMITTED] * 2
+        assert list((tmp_path / "journal").glob("*.npy")) == []
+        assert journal.finish_run(run_id)
+        assert journal.open_run() is None
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test metrics."""
+import json
+
+from src.metrics import Histogram, Metrics
+
+
+class TestHistogram:
+
+    def test_observe(self):
+        histogram = Histogram(buckets=(1, 10, 100))
+        for value in [0.5, 5, 5, 50, 500]:
+            histogram.observe(value)
+        assert histogram.counts == [1, 2, 1, 1]
+        assert histogram.count == 5
+        assert histogram.quantile(0.5) == 10
+        assert histogram.to_dict()["max"] == 500
+
+
+class TestMetrics:
+
+    def test_snapshot(self):
+        metrics = Metrics()
+        metrics.inc("files_processed", 3)
+        metrics.set("pending_files", 7)
+        with metrics.timer("parse_ms"):
+            pass
+        snapshot = metrics.snapshot()
+        assert snapshot["counters"] == {"files_processed": 3}
+        assert "files_processed_per_second" in snapshot["rates"]
+        assert snapshot["gauges"] == {"pending_files": 7}
+        assert snapshot["histograms"]["parse_ms"]["count"] == 1
+        assert metrics.counter("files_processed") == 3
+        assert metrics.counter("files_failed") == 0
+
+    def test_export(self, tmp_path):
+        metrics = Metrics()
+        metrics.inc("files_skipped")
+        metrics.observe("write_ms", 12)
+        metrics.export(tmp_path / "metrics.json")
+        assert json.loads((tmp_path / "metrics.json").read_text())["counters"] == {
+            "files_skipped": 1
+        }
+        metrics.export(tmp_path / "metrics.prom", fmt="prometheus")
+        text = (tmp_path / "metrics.prom").read_text()
+        assert "legislation_files_skipped_total 1" in text
+        assert 'legislation_write_ms_bucket{le="+Inf"} 1' in text
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test profiling utilities."""
+import sys
+
+from src.profiling import profiled
+
+
+@profiled
+def main():
+    return sum(range(1000))
+
+
+@profiled
+def export_main():
+    return "exported"
+
+
+class TestProfiled:
+
+    def test_disabled(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(sys, "argv", ["process", "--out_dir", str(tmp_path)])
+        assert main() == 499500
+        assert list(tmp_path.iterdir()) == []
+
+    def test_reports(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(
+            sys, "argv", ["process", "--profile", "true", "--out_dir", str(tmp_path)]
+        )
+        assert main() == 499500
+        assert export_main() == "exported"
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "memory-test_profiling-export.txt",
+            "memory-test_profiling.txt",
+            "profile-test_profiling-export.prof",
+            "profile-test_profiling-export.txt",
+            "profile-test_profiling.prof",
+            "profile-test_profiling.txt",
+        ]
+        assert "Peak traced memory" in (tmp_path / "memory-test_profiling.txt").read_text()
+        assert "cumulative" in (tmp_path / "profile-test_profiling.txt").read_text()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test resource limit utilities."""
+import os
+
+import pytest
+
+from src.resources import cpu_quota, effective_cpu_count, memory_limit, memory_usage
+
+PAGE_SIZE = 4096
+PHYSICAL_MEMORY = 4 * 2**30
+
+
+@pytest.fixture(autouse=True)
+def host(monkeypatch):
+    """Pretend to run on a host with 4 GiB of memory and 4 usable CPUs."""
+    pages = {"SC_PAGE_SIZE": PAGE_SIZE, "SC_PHYS_PAGES": PHYSICAL_MEMORY // PAGE_SIZE}
+    monkeypatch.setattr(os, "sysconf", lambda name: pages[name])
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: {0, 1, 2, 3})
+
+
+class TestResources:
+
+    def test_cgroup_v2(self, tmp_path):
+        (tmp_path / "cpu.max").write_text("150000 100000\n")
+        (tmp_path / "memory.max").write_text("1073741824\n")
+        (tmp_path / "memory.current").write_text("500\n")
+        (tmp_path / "memory.stat").write_text("anon 300\ninactive_file 200\n")
+        assert cpu_quota(tmp_path) == 1.5
+        assert effective_cpu_count(tmp_path) == 2
+        assert memory_limit(tmp_path) == 1073741824
+        assert memory_usage(tmp_path) == 300
+
+    def test_cgroup_v1(self, tmp_path):
+        (tmp_path / "cpu").mkdir()
+        (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+        (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+        (tmp_path / "memory").mkdir()
+        (tmp_path / "memory" / "memory.limit_in_bytes").write_text(f"{2**63 - 4096}\n")
+        (tmp_path / "memory" / "memory.usage_in_bytes").write_text("1000\n")
+        (tmp_path / "memory" / "memory.stat").write_text("total_inactive_file 400\n")
+        assert cpu_quota(tmp_path) is None
+        assert effective_cpu_count(tmp_path) == 4
+        assert memory_limit(tmp_path) == PHYSICAL_MEMORY
+        assert memory_usage(tmp_path) == 600
+
+    def test_no_cgroup(self, tmp_path):
+        (tmp_path / "cpu.max").write_text("max 100000\n")
+        assert cpu_quota(tmp_path) is None
+        assert effective_cpu_count(tmp_path) == 4
+        assert memory_limit(tmp_path) == PHYSICAL_MEMORY
+        resident = int(open("/proc/self/statm").read().split()[1]) * PAGE_SIZE
+        assert memory_usage(tmp_path) == pytest.approx(resident, rel=0.5)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test sharded vector store."""
+from pathlib import Path
+
+import numpy as np
+
+from src.config import Config
+from src.shard import ShardedVectorStore, merge_shards, shard_key
+from src.vectorstore import LegislationVectorStore
+
+
+class TestShard:
+
+    def test_shard_key(self):
+        assert shard_key("BILLS-118hr1234ih.xml", "congress") == "congress-118"
+        assert shard_key("BILLS-118hr1234ih.xml", "hash", 4) == shard_key(
+            "BILLS-118hr1234ih.xml", "hash", 4
+        )
+        assert shard_key("BILLS-118hr1234ih.xml", "hash", 4).startswith("hash-0")
+
+    def test_fan_out(self, tmp_path):
+        config = Config().model_copy(
+            update={"db_dir": tmp_path / "embeddings", "shard_by": "congress"}
+        )
+        store = ShardedVectorStore(config=config)
+        rng = np.random.default_rng(0)
+        ids = [f"BILLS-{congress}hr{i}ih.xml" for congress in (116, 117, 118) for i in range(10)]
+        vectors = rng.standard_normal((len(ids), 8))
+        for name, files in store.partition([Path(idx) for idx in ids]).items():
+            rows = [ids.index(f.name) for f in files]
+            store.shard(name).add_records(
+                [ids[r] for r in rows],
+                vectors[rows],
+                [{"file_name": ids[r]} for r in rows],
+                [f"text {ids[r]}" for r in rows],
+            )
+        store.names = sorted(store._stores)
+        assert store.names == ["congress-116", "congress-117", "congress-118"]
+        assert store.collection.count() == 30
+
+        # The merged top-k equals the top-k of a single store
+        merged = LegislationVectorStore(
+            config=config.model_copy(update={"db_dir": tmp_path / "merged"})
+        )
+        assert merge_shards(store, merged, page_size=4) == 30
+        query = rng.standard_normal((2, 8))
+        expected = merged.collection.query(query_embeddings=query, n_results=5)
+        result = store.collection.query(query_embeddings=query, n_results=5)
+        assert result["ids"] == expected["ids"]
+        assert np.allclose(result["distances"], expected["distances"])
+
+        result = store.collection.get(ids=["BILLS-117hr3ih.xml", "BILLS-118hr4ih.xml"])
+        assert sorted(result["ids"]) == ["BILLS-117hr3ih.xml", "BILLS-118hr4ih.xml"]
+        assert store.lexical_index.search("BILLS-116hr2ih")[0][0] == "BILLS-116hr2ih.xml"
+        assert store.get_texts(
+            [{"file_name": "BILLS-118hr4ih.xml"}, {"file_name": "BILLS-116hr1ih.xml"}]
+        ) == ["text BILLS-118hr4ih.xml", "text BILLS-116hr1ih.xml"]
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test synthetic corpus generator."""
+from src.synthetic import SyntheticBillGenerator
+from src.xml import XMLParser
+
+
+class TestSyntheticBillGenerator:
+
+    def test_write_corpus(self, tmp_path):
+        generator = SyntheticBillGenerator(seed=1, sections=2, subsections=1)
+        paths = generator.write_corpus(tmp_path, count=3, versions=2)
+        assert len(paths) == 6
+        assert all(path.name.startswith("BILLS-") for path in paths)
+
+        result = XMLParser().parse_file(paths[0])
+        assert result["public_private"] == "public"
+        assert result["dc_format"] == "text/xml"
+        assert result["official_title"]
+        assert result["legis_num"]
+        assert len(result["text"].split()) > 2 * 60
+
+    def test_deterministic(self, tmp_path):
+        first = SyntheticBillGenerator(seed=7).write_corpus(tmp_path / "a", count=2)
+        second = SyntheticBillGenerator(seed=7).write_corpus(tmp_path / "b", count=2)
+        assert [p.name for p in first] == [p.name for p in second]
+        assert [p.read_bytes() for p in first] == [p.read_bytes() for p in second]
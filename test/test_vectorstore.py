@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test vector store."""
+import numpy as np
+
+from src.config import Config
+from src.vectorstore import LegislationVectorStore
+
+
+class TestLegislationVectorStore:
+
+    def test_upsert_in_chunks(self, tmp_path):
+        config = Config().model_copy(update={"db_dir": tmp_path})
+        store = LegislationVectorStore(config=config)
+        store.max_batch_size = 2
+        ids = [f"BILLS-118hr{i}ih.xml" for i in range(5)]
+        store.upsert(
+            ids,
+            np.ones((5, 4)),
+            [{"file_name": i} for i in ids],
+            [f"text {i}" for i in range(5)],
+        )
+        assert store.collection.count() == 5
+
+    def test_compact_texts(self, tmp_path):
+        config = Config().model_copy(update={"db_dir": tmp_path, "compact": True})
+        store = LegislationVectorStore(config=config)
+        ids = ["BILLS-118hr1ih.xml", "BILLS-118hr2ih.xml"]
+        store.upsert(
+            ids, np.ones((2, 4)), [{"file_name": i} for i in ids], ["one", "two"]
+        )
+        result = store.collection.get(ids=ids[::-1], include=["metadatas", "documents"])
+        assert result["documents"] == [None, None]
+        assert store.get_texts(result["metadatas"]) == [
+            "one" if i == ids[0] else "two" for i in result["ids"]
+        ]
+
+    def test_stores_created_on_use(self, tmp_path):
+        config = Config().model_copy(update={"db_dir": tmp_path})
+        store = LegislationVectorStore(config=config)
+        store.upsert(["a"], np.ones((1, 4)), [{"file_name": "a"}], ["text"])
+        assert store.get_texts([{"file_name": "a"}]) == ["text"]
+        assert not (tmp_path / "documents.sqlite3").exists()
+        assert not (tmp_path / "fts.sqlite3").exists()
+        store.lexical_index.add_many([{"file_name": "a", "text": "text"}])
+        assert (tmp_path / "fts.sqlite3").exists()
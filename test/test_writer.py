@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# *-*- coding: utf-8 -*-
+"""Test vector store writer."""
+import numpy as np
+import pytest
+
+from src.metrics import metrics
+from src.writer import VectorStoreWriter
+
+
+class FakeLexicalIndex:
+    def add_many(self, records):
+        pass
+
+
+class FakeVectorStore:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.upserts = []
+        self.lexical_index = FakeLexicalIndex()
+        self.processed = []
+
+    def upsert(self, ids, embeddings, metadatas, texts):
+        if self.fail:
+            raise RuntimeError("write failed")
+        self.upserts.append((ids, embeddings, metadatas))
+        return metadatas
+
+    def mark_files_processed(self, files):
+        self.processed.extend((str(path), signature) for path, signature, _ in files)
+
+
+def records(n, start=0, signature="v1"):
+    return [
+        {
+            "text": f"text {i}",
+            "file_name": f"BILLS-{i}.xml",
+            "source": f"data/BILLS-{i}.xml",
+            "signature": signature,
+        }
+        for i in range(start, start + n)
+    ]
+
+
+class TestVectorStoreWriter:
+
+    def test_flush_by_size(self):
+        store = FakeVectorStore()
+        writer = VectorStoreWriter(store, batch_size=3, interval=0)
+        writer.put(records(2), np.zeros((2, 4)))
+        assert store.upserts == []
+        assert store.processed == []
+        writer.put(records(2, start=2), np.zeros((2, 4)))
+        assert len(store.upserts[0][0]) == 4
+        assert len(store.processed) == 4
+        assert len(writer) == 0
+
+    def test_duplicate_ids_keep_latest(self):
+        store = FakeVectorStore()
+        writer = VectorStoreWriter(store, batch_size=10, interval=0)
+        writer.put(records(2), np.zeros((2, 4)))
+        writer.put(records(1, start=1, signature="v2"), np.ones((1, 4)))
+        assert writer.flush() == 2
+        ids, embeddings, _ = store.upserts[0]
+        assert ids == ["BILLS-0.xml", "BILLS-1.xml"]
+        assert embeddings[1].tolist() == [1, 1, 1, 1]
+        assert store.processed[1] == ("data/BILLS-1.xml", "v2")
+
+    def test_acknowledged_after_flush(self):
+        store = FakeVectorStore()
+        writer = VectorStoreWriter(store, batch_size=10, interval=0)
+        processed = metrics.counter("files_processed")
+        writer.put(records(2), np.zeros((2, 4)))
+        assert metrics.counter("files_processed") == processed
+        writer.flush()
+        assert metrics.counter("files_processed") == processed + 2
+        # Files are acknowledged with the signature taken before they were read
+        assert store.processed == [
+            ("data/BILLS-0.xml", "v1"),
+            ("data/BILLS-1.xml", "v1"),
+        ]
+        assert all("signature" not in m for m in store.upserts[0][2])
+
+    def test_failed_write_is_not_acknowledged(self):
+        store = FakeVectorStore(fail=True)
+        writer = VectorStoreWriter(store, batch_size=10, interval=0)
+        writer.put(records(2), np.zeros((2, 4)))
+        with pytest.raises(RuntimeError):
+            writer.flush()
+        assert store.processed == []
+        assert len(writer) == 2
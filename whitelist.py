@@ -9,3 +9,9 @@ FEED_EXPORT_ENCODING  # unused variable (src/crawler/settings.py:18)
 _.closed  # unused method (src/crawler/spiders/legislation_spider.py:44)
 reason  # unused variable (src/crawler/spiders/legislation_spider.py:44)
 _.start_requests  # unused method (src/crawler/spiders/legislation_spider.py:48)
+_.log_severity_level  # unused attribute (src/embedding.py:126)
+_.intra_op_num_threads  # unused attribute (src/embedding.py:127)
+_.inter_op_num_threads  # unused attribute (src/embedding.py:128)
+merge_main  # unused function (src/task/processor.py:590)
+export_main  # unused function (src/task/snapshot.py:220)
+import_main  # unused function (src/task/snapshot.py:233)